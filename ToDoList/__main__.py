@@ -1,4 +1,13 @@
-from todo_app import ToDoApp
+import os.path
+import sys
+
+if not __package__:
+    # started as `python ToDoList`: parent directory replaces package
+    # directory in module search path, so app modules are imported from
+    # package and do not shadow other modules
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from ToDoList.cli import main
 
 if __name__ == '__main__':
-    ToDoApp()
+    main()
@@ -0,0 +1,247 @@
+"""Benchmarks of storage, task model and task list rendering.
+
+Synthetic data sets are generated in a temporary directory: single days
+with `sizes` tasks and `years` of month files with `tasks_per_day` tasks
+every day. Every case is run `repeat` times and median and minimum time are
+reported. Results are written as JSON and can be compared with a baseline
+saved by a previous run; cases slower than baseline by more than
+`threshold` are reported as regressions.
+
+Task list cases need Tk display. When DISPLAY is not set and Xvfb is
+installed, they run on a temporary virtual display, otherwise they are
+skipped.
+"""
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from .core import TaskStore
+from .model import Task
+from .storage import create_backend, month_of
+from .summary import DaySummary
+
+
+SIZES = (10, 1000, 100000)
+YEARS = (1, 10)
+BACKENDS = ('journal', 'pickle', 'sqlite')
+DAY = date(2024, 5, 15)
+
+
+def make_tasks(count, prefix='task'):
+    return [Task(f'{prefix} {i} of synthetic day', done=i % 3 == 0) for i in range(count)]
+
+
+def make_years(storage, years, tasks_per_day, last_day=DAY):
+    """Store `years` of month files ending with month of last_day"""
+    if last_day.month == 12:
+        first_day = date(last_day.year - years + 1, 1, 1)
+    else:
+        first_day = date(last_day.year - years, last_day.month + 1, 1)
+    data_dicts = {}
+    day = first_day
+    while day <= last_day:
+        date_key = day.strftime(r'%x')
+        data_dicts.setdefault(month_of(date_key), {})[date_key] = make_tasks(tasks_per_day)
+        day += timedelta(days=1)
+    for month, data_dict in data_dicts.items():
+        storage.save_month(month, data_dict)
+    return sorted(data_dicts)
+
+
+def measure(func, repeat, setup=None):
+    """Run func `repeat` times (with arguments returned by setup); return seconds of every run"""
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+class Benchmark:
+    """Collects timings of benchmark cases"""
+
+    def __init__(self, directory, repeat=5, out=sys.stderr):
+        self.directory = directory
+        self.repeat = repeat
+        self.out = out
+        self.results = {}
+
+    def record(self, name, times):
+        self.results[name] = {
+            'median': statistics.median(times),
+            'min': min(times),
+            'runs': len(times),
+        }
+        print(f'{name:<45} {statistics.median(times) * 1000:10.3f} ms', file=self.out)
+
+    def run(self, name, func, setup=None, repeat=None):
+        self.record(name, measure(func, repeat or self.repeat, setup))
+
+    def data_dir(self, name):
+        path = os.path.join(self.directory, name)
+        shutil.rmtree(path, ignore_errors=True)
+        return path
+
+    def storage_cases(self, kind, sizes):
+        date_key = DAY.strftime(r'%x')
+        month = month_of(date_key)
+        for size in sizes:
+            tasks = make_tasks(size)
+            storage = create_backend(kind, self.data_dir(f'{kind}_day_{size}'))
+            self.run(f'{kind}/save/day_{size}', lambda: storage.save_month(month, {date_key: tasks}))
+            self.run(f'{kind}/load/day_{size}', lambda: storage.load_month(month))
+            storage.close()
+
+    def store_cases(self, kind, sizes):
+        date_key = DAY.strftime(r'%x')
+        for size in sizes:
+            data_dir = self.data_dir(f'{kind}_store_{size}')
+            storage = create_backend(kind, data_dir)
+            storage.save_month(month_of(date_key), {date_key: make_tasks(size)})
+            storage.close()
+            store = TaskStore(data_dir, storage_kind=kind)
+            store.tasks(date_key, pin=True)
+            repeat = max(self.repeat, 20)
+            self.run(f'{kind}/add/day_{size}', lambda: store.add(date_key, 'new task'), repeat=repeat)
+            self.run(f'{kind}/toggle/day_{size}', lambda: store.toggle(date_key, size // 2), repeat=repeat)
+            self.run(
+                f'{kind}/delete/day_{size}',
+                lambda: store.delete(date_key, len(store.tasks(date_key)) - 1),
+                repeat=repeat
+            )
+
+            def change_month():
+                store.month_cache.mark_dirty(month_of(date_key))
+                return ()
+
+            self.run(f'{kind}/flush/day_{size}', store.flush, setup=change_month)
+            store.close()
+
+    def years_cases(self, kind, years, tasks_per_day):
+        for count in years:
+            data_dir = self.data_dir(f'{kind}_years_{count}')
+            storage = create_backend(kind, data_dir)
+            months = make_years(storage, count, tasks_per_day)
+            storage.close()
+
+            def switch_months():
+                # cold cache, as when user pages through calendar months
+                store = TaskStore(data_dir, storage_kind=kind)
+                for month in months:
+                    store.tasks(date(int(month[:4]), int(month[5:]), 1), pin=True)
+                store.close(save_indexes=False)
+
+            def scan_months():
+                store = TaskStore(data_dir, storage_kind=kind)
+                DaySummary().rebuild(store.storage)
+                store.close(save_indexes=False)
+
+            self.run(f'{kind}/month_switch/years_{count}', switch_months)
+            self.run(f'{kind}/scan/years_{count}', scan_months)
+
+    def listbox_cases(self, sizes):
+        try:
+            import tkinter as tk
+            from .custom_widgets import VirtualListbox
+            root = tk.Tk()
+        except Exception as e:
+            print(f'task list benchmarks skipped: {e}', file=self.out)
+            return
+        root.withdraw()
+        style = {'fg': '#212529'}
+        listbox = VirtualListbox(root, row_text=Task.display, row_style=lambda idx: style, height=11)
+        listbox.pack()
+        for size in sizes:
+            tasks = make_tasks(size)
+
+            def show():
+                listbox.set_items(tasks)
+                root.update_idletasks()
+
+            def change():
+                tasks[size // 2].set_done(not tasks[size // 2].done)
+                listbox.row_changed(size // 2)
+                root.update_idletasks()
+
+            def scroll():
+                listbox.yview('moveto', 0.5)
+                root.update_idletasks()
+
+            self.run(f'listbox/show/day_{size}', show)
+            listbox.see(size // 2)
+            self.run(f'listbox/row_changed/day_{size}', change)
+            self.run(f'listbox/scroll/day_{size}', scroll)
+        root.destroy()
+
+
+def start_virtual_display():
+    """Start Xvfb if there is no display; return its process or None"""
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin') or shutil.which('Xvfb') is None:
+        return None
+    display = f':{100 + os.getpid() % 400}'
+    process = subprocess.Popen(['Xvfb', display, '-nolisten', 'tcp'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    if process.poll() is not None:
+        return None
+    os.environ['DISPLAY'] = display
+    return process
+
+
+def compare(results, baseline, threshold):
+    """Return list of (name, baseline median, median) slower than baseline by over threshold"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result['median'] > base['median'] * (1 + threshold):
+            regressions.append((name, base['median'], result['median']))
+    return regressions
+
+
+def run_benchmarks(
+    backends=BACKENDS,
+    sizes=SIZES,
+    years=YEARS,
+    tasks_per_day=10,
+    repeat=5,
+    gui=True,
+    out=sys.stderr
+):
+    """Run all benchmark cases; return results dictionary written as JSON"""
+    with tempfile.TemporaryDirectory(prefix='todo-benchmark-') as directory:
+        benchmark = Benchmark(directory, repeat, out)
+        for kind in backends:
+            benchmark.storage_cases(kind, sizes)
+            benchmark.store_cases(kind, sizes)
+            benchmark.years_cases(kind, years, tasks_per_day)
+        if gui:
+            display = start_virtual_display()
+            try:
+                benchmark.listbox_cases(sizes)
+            finally:
+                if display is not None:
+                    display.terminate()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': benchmark.results,
+    }
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+
+
+def adjacent_months(month):
+    """Return ('YYYY_MM' previous month, 'YYYY_MM' next month) for month key"""
+    year, month_number = (int(part) for part in month.split('_'))
+    previous_year, previous_month = (year - 1, 12) if month_number == 1 else (year, month_number - 1)
+    next_year, next_month = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+    return f'{previous_year:04}_{previous_month:02}', f'{next_year:04}_{next_month:02}'
+
+
+class MonthCache:
+    """LRU cache of month dictionaries loaded from storage backend.
+
+    Cached dictionaries are shared with the app and changed in place, so
+    months changed by the app have to be marked dirty. Dirty months are
+    saved only when they are evicted or flushed. Backends which persist every
+    change on their own (`records_changes`) never have dirty months. Month
+    shown in the app is pinned and never evicted. With `writer` months are
+    saved by write-behind thread instead of the calling thread.
+    """
+
+    def __init__(self, storage, size=6, writer=None):
+        self.storage = storage
+        self.writer = writer
+        self.size = max(size, 1)
+        self._months = OrderedDict()
+        self._dirty = set()
+        self._pinned = None
+        self._lock = threading.Lock()
+
+    def _load(self, month):
+        if self.writer is not None:
+            # month evicted a moment ago (or its records) may still be being written
+            self.writer.wait_for(month)
+        if self.storage.indexed:
+            # days of indexed backends are loaded one by one on demand
+            return {}
+        return self.storage.load_month(month)
+
+    def load_day(self, month, date):
+        """Load one day of month from indexed backend, after pending writes of month"""
+        if self.writer is not None:
+            self.writer.wait_for(month)
+        return self.storage.load_day(date)
+
+    def _save(self, month, data_dict):
+        if self.writer is not None:
+            self.writer.submit_month(month, data_dict)
+        else:
+            self.storage.save_month(month, data_dict)
+
+    def get(self, month, pin=False):
+        if pin:
+            self._pinned = month
+        with self._lock:
+            if month in self._months:
+                self._months.move_to_end(month)
+                return self._months[month]
+        data_dict = self._load(month)
+        return self._insert(month, data_dict)
+
+    def _insert(self, month, data_dict):
+        with self._lock:
+            # month could be loaded by prefetch thread in the meantime
+            if month in self._months:
+                self._months.move_to_end(month)
+                return self._months[month]
+            self._months[month] = data_dict
+            evicted = []
+            for key in list(self._months):
+                if len(self._months) <= self.size:
+                    break
+                if key != self._pinned:
+                    evicted.append((key, self._months.pop(key)))
+            evicted = [(key, value) for key, value in evicted if key in self._dirty]
+            self._dirty.difference_update(key for key, _ in evicted)
+        for key, value in evicted:
+            self._save(key, value)
+        return data_dict
+
+    def peek(self, month):
+        """Return cached month dictionary or None, without loading it"""
+        with self._lock:
+            return self._months.get(month)
+
+    def load_uncached(self, month):
+        """Load month from storage without adding it to cache"""
+        if self.writer is not None:
+            self.writer.wait_for(month)
+        return self.storage.load_month(month)
+
+    def __contains__(self, month):
+        with self._lock:
+            return month in self._months
+
+    def mark_dirty(self, month):
+        if not self.storage.records_changes:
+            with self._lock:
+                self._dirty.add(month)
+
+    def flush(self):
+        """Save all dirty months"""
+        with self._lock:
+            dirty = [(month, self._months[month]) for month in self._dirty if month in self._months]
+            self._dirty.clear()
+        for month, data_dict in dirty:
+            self._save(month, data_dict)
+
+    def prefetch(self, months):
+        """Load months missing in cache on worker thread"""
+        if self.storage.indexed:
+            return None
+        months = [month for month in months if month not in self]
+        if not months:
+            return None
+
+        def worker():
+            for month in months:
+                if month not in self:
+                    self._insert(month, self._load(month))
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,239 @@
+# imported first, so startup profile starts as early as possible
+from . import startup_profile
+import argparse
+import os.path
+
+
+main_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_path = os.path.join(main_path, 'data', 'app_data')
+
+
+def run_app(args):
+    startup_profile.enabled = args.startup_profile
+    from . import instrument
+    instrument.enabled = args.instrument or args.trace is not None
+    # GUI modules are imported only when app is started
+    from .todo_app import ToDoApp
+    startup_profile.mark('modules imported')
+    ToDoApp(storage_kind=args.storage, month_cache_size=args.cache_size)
+    if args.trace is not None:
+        instrument.export_trace(args.trace)
+        print(f'Trace written to {args.trace}')
+
+
+def run_migrate(args):
+    from .storage import migrate_to_sqlite
+    count = migrate_to_sqlite(args.data_dir, args.database)
+    print(f'Imported {count} tasks into SQLite database')
+
+
+def run_reindex(args):
+    from .core import TaskStore
+    store = TaskStore(args.data_dir, storage_kind=args.storage or 'journal')
+    store.rebuild_indexes()
+    store.close()
+    print(f'Indexed {len(store.search_index.tasks)} tasks')
+
+
+def run_import(args):
+    from .core import TaskStore
+    from .transfer import import_file
+    store = TaskStore(args.data_dir, storage_kind=args.storage or 'journal')
+    try:
+        rows, added = import_file(store, args.file, args.format, args.buffer_size)
+    except ValueError as e:
+        raise SystemExit(f'Cannot import {args.file}: {e}')
+    finally:
+        store.close()
+    print(f'Added {added} tasks ({rows - added} already stored)')
+
+
+def run_export(args):
+    from .core import TaskStore
+    from .transfer import export_file
+    store = TaskStore(args.data_dir, storage_kind=args.storage or 'journal')
+    try:
+        export_file(store, args.file, args.format)
+    finally:
+        store.close(save_indexes=False)
+
+
+def run_benchmark(args):
+    from .benchmark import compare, load_results, run_benchmarks, save_results
+    results = run_benchmarks(
+        backends=args.backends.split(','),
+        sizes=[int(size) for size in args.sizes.split(',')],
+        years=[int(years) for years in args.years.split(',')],
+        repeat=args.repeat,
+        gui=not args.no_gui
+    )
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+    elif os.path.isfile(args.baseline):
+        regressions = compare(results['results'], load_results(args.baseline), args.threshold)
+        for name, base, current in regressions:
+            print(f'REGRESSION {name}: {base * 1000:.3f} ms -> {current * 1000:.3f} ms')
+        if regressions:
+            raise SystemExit(1)
+        print('No regressions against baseline')
+
+
+def run_archive(args):
+    from .core import TaskStore
+    store = TaskStore(args.data_dir, storage_kind=args.storage or 'journal')
+    try:
+        months = store.archive_old_months(args.older_than)
+    finally:
+        store.close(save_indexes=False)
+    print(f'Archived {len(months)} months')
+
+
+def run_serve(args):
+    import signal
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        raise SystemExit('Task server needs Unix domain sockets')
+    from .core import TaskStore
+    from .server import TaskServer, socket_file_path
+    store = TaskStore(
+        args.data_dir,
+        storage_kind=args.storage or 'journal',
+        month_cache_size=args.cache_size or 24,
+        background=True
+    )
+    missing_indexes = store.load_indexes()
+    if missing_indexes:
+        store.rebuild_indexes(missing_indexes)
+    server = TaskServer(store, socket_file_path(args.data_dir))
+    try:
+        server.bind()
+    except RuntimeError as e:
+        store.close(save_indexes=False)
+        raise SystemExit(str(e))
+    # stop on Ctrl+C and on kill
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f'Serving tasks on {server.path}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # pending writes are finished even when stop is requested again
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        server.close()
+    print('Task server stopped')
+
+
+def run_fsck(args):
+    from .fsck import check_data_dir
+    if not os.path.isdir(args.data_dir):
+        raise SystemExit(f'Data directory {args.data_dir} does not exist')
+    try:
+        problems = check_data_dir(args.data_dir, args.output, args.jobs)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.output is not None:
+        print(f'Repaired copy written to {args.output}')
+    if problems:
+        raise SystemExit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='todolist', description='ToDo List GUI Application')
+    parser.add_argument(
+        '--storage',
+        choices=['journal', 'pickle', 'sqlite'],
+        default=None,
+        help='task storage backend (default: journal)'
+    )
+    parser.add_argument('--cache-size', type=int, default=None, help='number of months kept in memory (default: 6)')
+    parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help='print time of startup steps from start to first paint and loaded tasks'
+    )
+    parser.add_argument(
+        '--instrument',
+        action='store_true',
+        help='time actions and storage calls, detect event loop stalls (F12 shows stats)'
+    )
+    parser.add_argument('--trace', default=None, help='with --instrument, write Chrome trace JSON to file on exit')
+    parser.set_defaults(command=run_app)
+    subparsers = parser.add_subparsers(title='commands')
+
+    migrate = subparsers.add_parser('migrate', help='import all task_data_YYYY_MM.dat files into SQLite database')
+    migrate.add_argument('--data-dir', default=data_path, help='directory with month files')
+    migrate.add_argument('--database', default=None, help='SQLite database path (default: DATA_DIR/tasks.sqlite3)')
+    migrate.set_defaults(command=run_migrate)
+
+    reindex = subparsers.add_parser('reindex', help='rebuild search index and day summary from stored tasks')
+    reindex.add_argument('--data-dir', default=data_path, help='directory with month files')
+    reindex.set_defaults(command=run_reindex)
+
+    import_parser = subparsers.add_parser('import', help='add tasks from CSV or JSON Lines file')
+    import_parser.add_argument('file', help="input file ('-' for standard input)")
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help='file format (default: by extension)')
+    import_parser.add_argument('--data-dir', default=data_path, help='directory with month files')
+    import_parser.add_argument(
+        '--buffer-size',
+        type=int,
+        default=100000,
+        help='rows kept in memory before they are spilled to temporary files (default: 100000)'
+    )
+    import_parser.set_defaults(command=run_import)
+
+    export_parser = subparsers.add_parser('export', help='write all tasks to CSV or JSON Lines file')
+    export_parser.add_argument('file', help="output file ('-' for standard output)")
+    export_parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help='file format (default: by extension)')
+    export_parser.add_argument('--data-dir', default=data_path, help='directory with month files')
+    export_parser.set_defaults(command=run_export)
+
+    archive = subparsers.add_parser('archive', help='move old month files into compressed archive')
+    archive.add_argument('--older-than', type=int, default=12, help='age of archived months in months (default: 12)')
+    archive.add_argument('--data-dir', default=data_path, help='directory with month files')
+    archive.set_defaults(command=run_archive)
+
+    fsck = subparsers.add_parser('fsck', help='check all month files, rebuild indexes and write repaired copy')
+    fsck.add_argument('--data-dir', default=data_path, help='directory with month files')
+    fsck.add_argument(
+        '--output',
+        default=None,
+        help='empty directory for repaired month files and indexes (default: only check and rebuild indexes)'
+    )
+    fsck.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    fsck.set_defaults(command=run_fsck)
+
+    serve = subparsers.add_parser('serve', help='share tasks between app windows and scripts through local server')
+    serve.add_argument('--data-dir', default=data_path, help='directory with month files')
+    serve.set_defaults(command=run_serve)
+
+    benchmark = subparsers.add_parser('benchmark', help='time storage, task and task list operations on synthetic data')
+    benchmark.add_argument('--backends', default='journal,pickle,sqlite', help='comma separated storage backends')
+    benchmark.add_argument('--sizes', default='10,1000,100000', help='comma separated numbers of tasks in a day')
+    benchmark.add_argument('--years', default='1,10', help='comma separated numbers of years of month files')
+    benchmark.add_argument('--repeat', type=int, default=5, help='runs of every case (default: 5)')
+    benchmark.add_argument('--no-gui', action='store_true', help='skip task list benchmarks')
+    benchmark.add_argument('--output', default=None, help='write results to JSON file')
+    benchmark.add_argument(
+        '--baseline',
+        default=os.path.join(main_path, 'data', 'benchmark_baseline.json'),
+        help='results of previous run compared with current results'
+    )
+    benchmark.add_argument('--save-baseline', action='store_true', help='save current results as baseline')
+    benchmark.add_argument(
+        '--threshold',
+        type=float,
+        default=0.25,
+        help='relative slowdown reported as regression (default: 0.25)'
+    )
+    benchmark.set_defaults(command=run_benchmark)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.command(args)
@@ -0,0 +1,456 @@
+"""GUI-free task store.
+
+    from ToDoList.core import TaskStore
+
+    store = TaskStore()
+    with store.batch():
+        for text in checklist:
+            store.add(date.today(), text)
+    store.close()
+
+Dates are `datetime.date` objects or strings in locale '%x' format (the
+format used as keys in month files).
+"""
+import os
+import os.path
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date as date_type, timedelta
+
+from .cache import MonthCache
+from .model import Task
+from .recurring import RecurringTasks, recurring_file_path
+from .search import SearchIndex, index_file_path
+from .storage import create_backend, month_of, parse_date
+from .summary import DaySummary, summary_file_path
+from .writer import WriteBehind
+
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'app_data')
+
+
+def index_marker_path(directory):
+    return os.path.join(directory, 'indexes.dirty')
+
+
+def date_key(date):
+    """Return task date in locale '%x' format used as key in month dictionaries"""
+    if isinstance(date, date_type):
+        return date.strftime(r'%x')
+    return date
+
+
+def days_by_month(start, end):
+    """Group days from start to end (inclusive) as [(month, [day, ...]), ...]"""
+    months = []
+    day = start
+    while day <= end:
+        month = day.strftime('%Y_%m')
+        if not months or months[-1][0] != month:
+            months.append((month, []))
+        months[-1][1].append(day)
+        day += timedelta(days=1)
+    return months
+
+
+def parse_day(date):
+    """Return task date (`datetime.date` or locale '%x' string) as `datetime.date`"""
+    if isinstance(date, date_type):
+        return date
+    return parse_date(date).date()
+
+
+class TaskStore:
+    """Tasks of all days with loading, saving and indexes.
+
+    Tasks of a day are returned by `tasks` as list of `Task`; the list is
+    shared with the store and must be changed only with store methods (add,
+    edit, set_done, toggle, delete and their bulk variants). Every change is
+    stored with storage backend and updates search index and day summary.
+    Changes made inside `batch()` are stored together when batch ends:
+    records in one storage transaction. Backends which do not record
+    changes write changed months only when they are evicted from month
+    cache, on `flush` and on `close`.
+    Changes of `batch(undo=True)` are kept as one unit which is reverted by
+    `undo()`.
+
+    With `background=True` storage writes are done by write-behind thread
+    (used by the app, so UI does not wait for disk).
+
+    Indexes are written only by `save_indexes` and `close`, so marker file
+    is created before the first change is stored and removed once indexes
+    matching all stored changes are saved. If process ends without that
+    (crash, kill), `load_indexes` finds the marker and reports both indexes
+    for rebuild.
+    """
+
+    # number of undoable batches kept
+    undo_limit = 50
+
+    def __init__(self, data_path=DATA_PATH, storage_kind='journal', month_cache_size=6, background=False):
+        self.data_path = data_path
+        self.storage = create_backend(storage_kind, data_path)
+        self.writer = WriteBehind(self.storage) if background else None
+        self.month_cache = MonthCache(self.storage, month_cache_size, self.writer)
+        self.search_index = SearchIndex(index_file_path(data_path))
+        self.day_summary = DaySummary(summary_file_path(data_path))
+        # indexes not loaded or rebuilt are never saved as up to date
+        self._stale_indexes = [self.search_index, self.day_summary]
+        self._indexes_dirty = False
+        self._batch_depth = 0
+        self._batch_records = []
+        self._undo_log = None
+        self.undo_stack = []
+        self._recurring = None
+        self._lock = threading.RLock()
+
+    def load_indexes(self):
+        """Load search index and day summary; return list of indexes missing on disk or out of date"""
+        with self._lock:
+            # marker left by process which did not save indexes after changes
+            self._indexes_dirty = os.path.isfile(index_marker_path(self.data_path))
+            search_index = day_summary = None
+            if not self._indexes_dirty:
+                search_index = SearchIndex.load(index_file_path(self.data_path))
+                day_summary = DaySummary.load(summary_file_path(self.data_path))
+            self.search_index = search_index or self.search_index
+            self.day_summary = day_summary or self.day_summary
+            self._stale_indexes = [
+                index for index, loaded in ((self.search_index, search_index), (self.day_summary, day_summary))
+                if loaded is None
+            ]
+            return list(self._stale_indexes)
+
+    def mark_indexes_dirty(self):
+        """Create marker of indexes not matching stored tasks (before changes are stored)"""
+        with self._lock:
+            if not self._indexes_dirty:
+                # first change of new data directory is stored after this
+                os.makedirs(self.data_path, exist_ok=True)
+                with open(index_marker_path(self.data_path), 'wb'):
+                    pass
+                self._indexes_dirty = True
+
+    def _indexes_saved(self):
+        # remove marker once all indexes are up to date on disk
+        with self._lock:
+            if self._indexes_dirty and not self._stale_indexes:
+                try:
+                    os.remove(index_marker_path(self.data_path))
+                except FileNotFoundError:
+                    pass
+                self._indexes_dirty = False
+
+    @property
+    def recurring(self):
+        """Recurring task rules, loaded on first use"""
+        with self._lock:
+            if self._recurring is None:
+                path = recurring_file_path(self.data_path)
+                self._recurring = RecurringTasks.load(path) or RecurringTasks(path)
+            return self._recurring
+
+    def occurrences(self, date):
+        """Occurrences of recurring tasks on date"""
+        return self.recurring.occurrences(parse_day(date))
+
+    def add_rule(self, text, kind, start, interval=1):
+        """Add recurring task repeated 'daily', on 'weekdays', 'weekly', 'monthly' or 'every' interval days"""
+        rule = self.recurring.add_rule(text, kind, parse_day(start), interval)
+        self._save_recurring()
+        return rule
+
+    def end_rule(self, rule_id, last_date):
+        self.recurring.end_rule(rule_id, parse_day(last_date))
+        self._save_recurring()
+
+    def set_occurrence_done(self, occurrence, done):
+        self.recurring.set_done(occurrence, done)
+        self._save_recurring()
+
+    def edit_occurrence(self, occurrence, text):
+        self.recurring.set_text(occurrence, text)
+        self._save_recurring()
+
+    def skip_occurrence(self, occurrence):
+        self.recurring.skip(occurrence)
+        self._save_recurring()
+
+    def _save_recurring(self):
+        if self.writer is not None:
+            self.writer.submit_file(self.recurring.path, self.recurring.dumps())
+        else:
+            self.recurring.save()
+
+    def tasks(self, date, pin=False):
+        """Return list of tasks of date; `pin` keeps month of date in cache"""
+        date = date_key(date)
+        month = self.month_cache.get(month_of(date), pin=pin)
+        if self.storage.indexed and date not in month:
+            month[date] = self.month_cache.load_day(month_of(date), date)
+        return month.setdefault(date, [])
+
+    def _range_month(self, month, days):
+        # tasks of days of one month; only these days are kept, not whole month
+        cached = self.month_cache.peek(month)
+        data_dict = {}
+        if cached is None or self.storage.indexed:
+            # cache of indexed backend holds only days shown by app
+            data_dict = self.month_cache.load_uncached(month)
+        cached = cached or {}
+        result = []
+        for day in days:
+            date = date_key(day)
+            if date in cached:
+                result.append((day, [task.copy() for task in cached[date]]))
+            else:
+                result.append((day, data_dict.get(date, [])))
+        return result
+
+    def iter_days(self, start, end, workers=4):
+        """Yield (day, tasks) for every day from start to end (`datetime.date`, inclusive).
+
+        Months are read on thread pool, at most `workers` months ahead of
+        the day being yielded, so memory use does not depend on length of
+        range. Tasks are copies; changing them does not change the store.
+        """
+        months = iter(days_by_month(start, end))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='todo-range')
+        pending = deque()
+        try:
+            for month, days in months:
+                pending.append(pool.submit(self._range_month, month, days))
+                if len(pending) == workers:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                for month, days in months:
+                    pending.append(pool.submit(self._range_month, month, days))
+                    break
+                yield from result
+        finally:
+            # months not needed when generator is closed early are not loaded
+            # (shutdown(cancel_futures=True) needs Python 3.9)
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def add(self, date, text, done=False):
+        return self.append(date, Task(text, done))
+
+    def append(self, date, task):
+        """Add existing task (e.g. moved from other day) at the end of date"""
+        date = date_key(date)
+        tasks = self.tasks(date)
+        tasks.append(task)
+        self._undo_append(('remove', date, task.id))
+        self._record(date, 'add', len(tasks) - 1, task)
+        return task
+
+    def insert(self, date, idx, task):
+        date = date_key(date)
+        self.tasks(date).insert(idx, task)
+        self._undo_append(('remove', date, task.id))
+        self._record(date, 'insert', idx, task)
+        return task
+
+    def edit(self, date, idx, text):
+        date = date_key(date)
+        task = self.tasks(date)[idx]
+        self._undo_append(('edit', date, task.id, task.text))
+        task.set_text(text)
+        self._record(date, 'edit', idx, task)
+        return task
+
+    def set_done(self, date, idx, done):
+        date = date_key(date)
+        task = self.tasks(date)[idx]
+        if task.done != done:
+            self._undo_append(('set_done', date, task.id, task.done))
+            task.set_done(done)
+            self._record(date, 'toggle', idx, task)
+        return task
+
+    def toggle(self, date, idx):
+        date = date_key(date)
+        return self.set_done(date, idx, not self.tasks(date)[idx].done)
+
+    def delete(self, date, idx):
+        date = date_key(date)
+        task = self.tasks(date).pop(idx)
+        self._undo_append(('insert', date, idx, task))
+        self._record(date, 'delete', idx, task)
+        return task
+
+    def set_done_many(self, date, indices, done):
+        with self.batch(undo=True):
+            for idx in indices:
+                self.set_done(date, idx, done)
+
+    def delete_many(self, date, indices):
+        """Delete tasks at indices; return deleted tasks in original order"""
+        with self.batch(undo=True):
+            tasks = [self.delete(date, idx) for idx in sorted(indices, reverse=True)]
+        return tasks[::-1]
+
+    def move_many(self, date, indices, to_date):
+        """Move tasks at indices to the end of to_date, keeping their order"""
+        date, to_date = date_key(date), date_key(to_date)
+        if date == to_date:
+            return []
+        with self.batch(undo=True):
+            tasks = self.delete_many(date, indices)
+            for task in tasks:
+                self.append(to_date, task)
+        return tasks
+
+    def _undo_append(self, operation):
+        if self._undo_log is not None:
+            self._undo_log.append(operation)
+
+    def _task_index(self, date, task_id):
+        for idx, task in enumerate(self.tasks(date)):
+            if task.id == task_id:
+                return idx
+        return None
+
+    def undo(self):
+        """Revert last undoable batch; return set of changed dates (empty if nothing to undo)"""
+        if not self.undo_stack:
+            return set()
+        operations = self.undo_stack.pop()
+        with self.batch():
+            for operation, date, *args in reversed(operations):
+                if operation == 'insert':
+                    idx, task = args
+                    self.insert(date, min(idx, len(self.tasks(date))), task)
+                    continue
+                # tasks are found by id, as other tasks could be added since
+                idx = self._task_index(date, args[0])
+                if idx is None:
+                    continue
+                if operation == 'remove':
+                    self.delete(date, idx)
+                elif operation == 'edit':
+                    self.edit(date, idx, args[1])
+                elif operation == 'set_done':
+                    self.set_done(date, idx, args[1])
+        return {operation[1] for operation in operations}
+
+    def _record(self, date, operation, idx, task):
+        # store change of task at idx and update derived indexes
+        month = month_of(date)
+        if operation == 'add':
+            record = (operation, date, task.to_record())
+        elif operation == 'delete':
+            record = (operation, date, idx)
+        else:
+            record = (operation, date, idx, task.to_record())
+        with self._lock:
+            if self._batch_depth:
+                self._batch_records.append((month, record))
+            else:
+                self._store_records(month, [record])
+        self.month_cache.mark_dirty(month)
+        if operation == 'delete':
+            self.search_index.remove_task(task.id)
+        elif operation in ('add', 'insert', 'edit'):
+            self.search_index.index_task(date, task)
+        self.day_summary.task_changed(date, operation, task)
+
+    def _store_records(self, month, records):
+        self.mark_indexes_dirty()
+        if self.writer is not None:
+            self.writer.submit_records(month, records)
+        else:
+            self.storage.record_many(month, records)
+
+    @contextmanager
+    def batch(self, undo=False):
+        """Store all changes made inside `with` block together.
+
+        With `undo` changes are also kept as one unit for `undo()` (nested
+        batches belong to the unit of the outer one).
+        """
+        collect_undo = undo and self._undo_log is None
+        with self._lock:
+            self._batch_depth += 1
+        if collect_undo:
+            self._undo_log = []
+        try:
+            yield self
+        finally:
+            if collect_undo:
+                if self._undo_log:
+                    self.undo_stack.append(self._undo_log)
+                    del self.undo_stack[:-self.undo_limit]
+                self._undo_log = None
+            with self._lock:
+                self._batch_depth -= 1
+                records = []
+                if not self._batch_depth:
+                    records, self._batch_records = self._batch_records, []
+            if records:
+                self._store_batch(records)
+
+    def _store_batch(self, records):
+        by_month = {}
+        for month, record in records:
+            by_month.setdefault(month, []).append(record)
+        for month, month_records in by_month.items():
+            self._store_records(month, month_records)
+
+    def flush(self, wait=True):
+        """Write months changed since loading; with `wait` also wait for write-behind thread"""
+        self.month_cache.flush()
+        if wait and self.writer is not None:
+            self.writer.flush()
+
+    def rebuild_indexes(self, indexes=None, flush=True):
+        """Build search index and day summary (or given indexes) from storage"""
+        if flush:
+            self.flush()
+        # rebuilt indexes are saved on close, marker is removed after that
+        self.mark_indexes_dirty()
+        for index in indexes or (self.search_index, self.day_summary):
+            index.rebuild(self.storage)
+            with self._lock:
+                if index in self._stale_indexes:
+                    self._stale_indexes.remove(index)
+
+    def archive_old_months(self, age):
+        """Move months older than `age` months to cold archive; return archived months"""
+        today = date_type.today()
+        months = today.year * 12 + today.month - 1 - age
+        self.flush()
+        return self.storage.archive_months(f'{months // 12:04}_{months % 12 + 1:02}')
+
+    def save_indexes(self):
+        """Write changed indexes (with write-behind thread marker is removed by `close`)"""
+        for index in (self.search_index, self.day_summary):
+            if index.changed:
+                if self.writer is not None:
+                    self.writer.submit_file(index.path, index.dumps())
+                else:
+                    index.save()
+        if self.writer is None:
+            self._indexes_saved()
+
+    def close(self, timeout=None, save_indexes=True):
+        """Write all changes and close storage.
+
+        Returns False if write-behind thread did not finish in `timeout`
+        seconds; it then finishes writes before process exits.
+        """
+        self.flush(wait=False)
+        if save_indexes:
+            self.save_indexes()
+        if self.writer is not None:
+            if not self.writer.close(timeout):
+                return False
+            if save_indexes:
+                self._indexes_saved()
+        self.storage.close()
+        return True
@@ -0,0 +1,197 @@
+import time
+import ttkbootstrap as ttk
+from ttkbootstrap.dialogs import Querybox, DatePickerDialog
+from ttkbootstrap.constants import *
+from datetime import date
+
+from . import instrument
+
+
+class CustomQuerybox(Querybox):
+    @staticmethod
+    def get_date(
+            parent=None,
+            title=" ",
+            firstweekday=6,
+            startdate=None,
+            bootstyle="secondary",
+            day_marker=None,
+    ):
+        """Shows a calendar popup and returns the selection.
+
+        ![](../../assets/dialogs/querybox-get-date.png)
+
+        Parameters:
+
+            parent (Widget):
+                The parent widget; the popup will appear to the
+                bottom-right of the parent widget. If no parent is
+                provided, the widget is centered on the screen.
+
+            title (str):
+                The text that appears on the popup titlebar.
+
+            firstweekday (int):
+                Specifies the first day of the week. `0` is Monday, `6` is
+                Sunday (the default).
+
+            startdate (datetime):
+                The date to be in focus when the widget is displayed;
+
+            bootstyle (str):
+                The following colors can be used to change the color of the
+                title and hover / pressed color -> primary, secondary, info,
+                warning, success, danger, light, dark.
+
+            day_marker (Callable[[date], str]):
+                Returns marker shown after day number of given date.
+
+        Returns:
+
+            datetime:
+                The date selected; the current date if no date is selected.
+        """
+        # change to CustomDatePicker
+        chooser = CustomDatePickerDialog(
+            parent=parent,
+            title=title,
+            firstweekday=firstweekday,
+            startdate=startdate,
+            bootstyle=bootstyle,
+            day_marker=day_marker,
+        )
+        return chooser.date_selected
+
+
+class DayCell:
+    """Calendar grid cell: label for days of other months, radiobutton for days of shown month"""
+
+    __slots__ = ('row', 'column', 'label', 'button', 'shown', 'text', 'style')
+
+    def __init__(self, row, column, label, button):
+        self.row = row
+        self.column = column
+        self.label = label
+        self.button = button
+        self.shown = None
+        self.text = None
+        self.style = None
+
+    def show(self, widget):
+        # grid widget (label, button or None) and hide the other one
+        if widget is self.shown:
+            return
+        if self.shown is not None:
+            self.shown.grid_remove()
+        if widget is not None:
+            widget.grid(row=self.row, column=self.column, sticky=NSEW)
+        self.shown = widget
+
+
+class CustomDatePickerDialog(DatePickerDialog):
+    """Date picker which creates calendar grid once and reuses it when
+    month changes; only text, value, style and visibility of day cells are
+    updated. Calendar updates are timed as 'CustomDatePickerDialog.draw_calendar'
+    when instrumentation is enabled.
+    """
+
+    def __init__(self, day_marker=None, **kwargs):
+        # set before parent constructor, which draws calendar
+        self.day_marker = day_marker
+        self.day_cells = None
+        super().__init__(**kwargs)
+
+    def _create_day_cells(self):
+        self.frm_dates = ttk.Frame(self.frm_calendar)
+        self.frm_dates.pack(fill=BOTH, expand=YES)
+        for col in range(7):
+            self.frm_dates.columnconfigure(col, weight=1)
+
+        self.day_cells = []
+        for row in range(6):
+            for col in range(7):
+                def selected(x=row, y=col):
+                    self._on_date_selected(x, y)
+
+                label = ttk.Label(
+                    master=self.frm_dates,
+                    anchor=CENTER,
+                    padding=5,
+                    bootstyle=INFO,
+                )
+                btn = ttk.Radiobutton(
+                    master=self.frm_dates,
+                    variable=self.datevar,
+                    bootstyle=f"{self.bootstyle}-calendar",
+                    padding=5,
+                    command=selected,
+                )
+                self.day_cells.append(DayCell(row, col, label, btn))
+
+    def _draw_calendar(self):
+        start = time.perf_counter()
+        self._update_widget_bootstyle()
+        self._set_title()
+        self._current_month_days()
+        if self.day_cells is None or not self.frm_dates.winfo_exists():
+            self._create_day_cells()
+
+        for cell in self.day_cells:
+            if cell.row >= len(self.monthdays):
+                cell.show(None)
+                continue
+            day = self.monthdays[cell.row][cell.column]
+            if day == 0:
+                text = self.monthdates[cell.row][cell.column].day
+                if cell.shown is not cell.label or cell.text != text:
+                    cell.label.configure(text=text)
+                cell.show(cell.label)
+            else:
+                if all(
+                    [
+                        day == self.date_selected.day,
+                        self.date.month == self.date_selected.month,
+                        self.date.year == self.date_selected.year,
+                    ]
+                ):
+                    day_style = "secondary-button"      # change from 'toolbutton' to 'button'
+                else:
+                    day_style = f"{self.bootstyle}-calendar"
+
+                if self.day_marker is not None:
+                    text = f'{day}{self.day_marker(date(self.date.year, self.date.month, day))}'
+                else:
+                    text = day
+
+                if cell.shown is not cell.button or cell.text != text:
+                    cell.button.configure(value=day, text=text)
+                if cell.style != day_style:
+                    cell.button.configure(bootstyle=day_style)
+                    cell.style = day_style
+                cell.show(cell.button)
+            cell.text = text
+        if instrument.enabled:
+            instrument.add_event('CustomDatePickerDialog.draw_calendar', 'ui', start, time.perf_counter() - start)
+
+    def _show_month(self, year, month):
+        # calendar grid is reused, so it is not destroyed like in DatePickerDialog
+        self.date = date(year=year, month=month, day=1)
+        self._draw_calendar()
+
+    def on_next_month(self):
+        year, month = (self.date.year + 1, 1) if self.date.month == 12 else (self.date.year, self.date.month + 1)
+        self._show_month(year, month)
+
+    def on_prev_month(self):
+        year, month = (self.date.year - 1, 12) if self.date.month == 1 else (self.date.year, self.date.month - 1)
+        self._show_month(year, month)
+
+    def on_next_year(self, *_):
+        self._show_month(self.date.year + 1, self.date.month)
+
+    def on_prev_year(self, *_):
+        self._show_month(self.date.year - 1, self.date.month)
+
+    def on_reset_date(self, *_):
+        self.date = self.startdate
+        self._draw_calendar()
@@ -1,12 +1,20 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.widgets import DateEntry
-from ttkbootstrap.dialogs import Querybox, DatePickerDialog
 from ttkbootstrap.constants import *
+import queue
+import threading
+import tkinter as tk
 from tkinter import END
-from datetime import datetime
+from datetime import datetime, timedelta
+from .custom_dialogs import CustomQuerybox
 
 
 class CustomDateEntry(DateEntry):
+    # called with start date when calendar popup is opened
+    date_ask_callback = None
+    # called with date of calendar day, returns marker shown after day number
+    day_marker = None
+
     def _configure_set(self, **kwargs):
         """Override configure method to allow for setting custom
         DateEntry parameters"""
@@ -59,6 +67,8 @@ class CustomDateEntry(DateEntry):
             )
 
         old_date = datetime.strptime(_val, self._dateformat)
+        if self.date_ask_callback is not None:
+            self.date_ask_callback(old_date)
 
         # get the new date and insert into the entry
         new_date = CustomQuerybox.get_date(
@@ -66,104 +76,539 @@ class CustomDateEntry(DateEntry):
             startdate=old_date,
             firstweekday=self._firstweekday,
             bootstyle=self._bootstyle,
+            day_marker=self.day_marker,
         )
         self.entry.delete(first=0, last=END)
         self.entry.insert(END, new_date.strftime(self._dateformat))
         self.entry.focus_force()
 
 
-class CustomQuerybox(Querybox):
-    @staticmethod
-    def get_date(
-            parent=None,
-            title=" ",
-            firstweekday=6,
-            startdate=None,
-            bootstyle="secondary",
-    ):
-        """Shows a calendar popup and returns the selection.
-
-        ![](../../assets/dialogs/querybox-get-date.png)
-
-        Parameters:
-
-            parent (Widget):
-                The parent widget; the popup will appear to the
-                bottom-right of the parent widget. If no parent is
-                provided, the widget is centered on the screen.
-
-            title (str):
-                The text that appears on the popup titlebar.
-
-            firstweekday (int):
-                Specifies the first day of the week. `0` is Monday, `6` is
-                Sunday (the default).
-
-            startdate (datetime):
-                The date to be in focus when the widget is displayed;
-
-            bootstyle (str):
-                The following colors can be used to change the color of the
-                title and hover / pressed color -> primary, secondary, info,
-                warning, success, danger, light, dark.
-
-        Returns:
-
-            datetime:
-                The date selected; the current date if no date is selected.
-        """
-        # change to CustomDatePicker
-        chooser = CustomDatePickerDialog(
-            parent=parent,
-            title=title,
-            firstweekday=firstweekday,
-            startdate=startdate,
-            bootstyle=bootstyle,
+class VirtualListbox(tk.Listbox):
+    """Listbox which creates only rows visible in its viewport.
+
+    Rows are taken from `items` list and at most `height` of them exist as
+    Listbox items at any time; scrolling replaces text and style of these
+    rows, so showing a day costs the same for 10 and 50000 tasks. Row text
+    is returned by `row_text(item)` and style of each row by
+    `row_style(index)` as itemconfig options.
+
+    Indices used by public methods (curselection, selection_set,
+    select_clear, itemconfig, get, see) are indices in `items`. After a
+    single row of `items` is changed, `row_inserted`, `row_deleted` or
+    `row_changed` update only that Listbox item instead of the whole view.
+    """
+
+    def __init__(self, master=None, row_text=str, row_style=None, **kwargs):
+        self._yscrollcommand = kwargs.pop('yscrollcommand', None)
+        super().__init__(master, **kwargs)
+        self.items = []
+        self.row_text = row_text
+        self.row_style = row_style
+        self.top = 0
+        self._selection = set()
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.bind(sequence, self._on_mouse_wheel)
+        self.bind('<ButtonPress-1>', self._on_click, add='+')
+
+    @property
+    def rows(self):
+        return int(self.cget('height'))
+
+    def set_items(self, items):
+        """Show new list of rows, scrolled to the top"""
+        self.items = items
+        self.top = 0
+        self._selection.clear()
+        self._render()
+
+    def refresh(self):
+        """Render rows of viewport from `items`"""
+        self._sync_selection()
+        self._render()
+
+    def _render(self):
+        size = len(self.items)
+        self.top = max(0, min(self.top, size - self.rows))
+
+        def action():
+            super(VirtualListbox, self).delete(0, END)
+            for idx in range(self.top, min(self.top + self.rows, size)):
+                self._render_row(idx)
+
+        self._edit_rows(action)
+
+    def _render_row(self, idx):
+        # insert row idx (which has to be in viewport) as Listbox item
+        view_idx = idx - self.top
+        super().insert(view_idx, self.row_text(self.items[idx]))
+        if self.row_style is not None:
+            super().itemconfig(view_idx, **self.row_style(idx))
+        if idx in self._selection:
+            super().selection_set(view_idx)
+
+    def _edit_rows(self, action):
+        # Listbox items can not be changed while Listbox is disabled
+        state = self.cget('state')
+        if state == 'disabled':
+            super().configure(state='normal')
+        action()
+        if state == 'disabled':
+            super().configure(state=state)
+        self._update_scrollbar()
+
+    def row_inserted(self, idx):
+        """Show row inserted into `items` at idx"""
+        self._sync_selection()
+        self._selection = {i + 1 if i >= idx else i for i in self._selection}
+        if idx < self.top:
+            # rows in viewport only move down in `items`
+            self.top += 1
+            self._update_scrollbar()
+            return
+
+        def action():
+            if idx - self.top < self.rows:
+                self._render_row(idx)
+                if super(VirtualListbox, self).size() > self.rows:
+                    super(VirtualListbox, self).delete(END)
+
+        self._edit_rows(action)
+
+    def row_deleted(self, idx):
+        """Remove row deleted from `items` at idx"""
+        self._sync_selection()
+        self._selection = {i - 1 if i > idx else i for i in self._selection if i != idx}
+        if idx < self.top:
+            self.top -= 1
+            self._update_scrollbar()
+            return
+        view_idx = idx - self.top
+        if view_idx >= super().size():
+            self._update_scrollbar()
+            return
+
+        def action():
+            super(VirtualListbox, self).delete(view_idx)
+            if self.top + self.rows - 1 < len(self.items):
+                # next row moves into viewport from below
+                self._render_row(self.top + self.rows - 1)
+            elif self.top > 0:
+                # list end reached, previous row moves into viewport from above
+                self.top -= 1
+                self._render_row(self.top)
+
+        self._edit_rows(action)
+
+    def row_changed(self, idx):
+        """Update text and style of row changed in `items` at idx"""
+        self._sync_selection()
+        view_idx = self._view_index(idx)
+        if view_idx is None:
+            return
+
+        def action():
+            super(VirtualListbox, self).delete(view_idx)
+            self._render_row(idx)
+
+        self._edit_rows(action)
+
+    def _sync_selection(self):
+        # keep selection of rows scrolled out of viewport
+        native = {self.top + idx for idx in super().curselection()}
+        if native and self.cget('selectmode') in (tk.SINGLE, tk.BROWSE):
+            self._selection = native
+        else:
+            visible = range(self.top, self.top + super().size())
+            self._selection = {idx for idx in self._selection if idx not in visible} | native
+
+    def _index(self, index):
+        if index == END:
+            return len(self.items) - 1
+        return int(index)
+
+    def _view_index(self, idx):
+        if self.top <= idx < self.top + super().size():
+            return idx - self.top
+        return None
+
+    def curselection(self):
+        self._sync_selection()
+        return tuple(sorted(self._selection))
+
+    def selection_set(self, first, last=None):
+        first = self._index(first)
+        last = first if last is None else self._index(last)
+        for idx in range(first, last + 1):
+            self._selection.add(idx)
+            view_idx = self._view_index(idx)
+            if view_idx is not None:
+                super().selection_set(view_idx)
+
+    select_set = selection_set
+
+    def selection_clear(self, first, last=None):
+        first = self._index(first)
+        last = first if last is None else self._index(last)
+        self._selection.difference_update(range(first, last + 1))
+        view_first = max(first - self.top, 0)
+        view_last = min(last - self.top, super().size() - 1)
+        if view_first <= view_last:
+            super().selection_clear(view_first, view_last)
+
+    select_clear = selection_clear
+
+    def itemconfigure(self, index, cnf=None, **kwargs):
+        view_idx = self._view_index(self._index(index))
+        if view_idx is not None:
+            return super().itemconfigure(view_idx, cnf, **kwargs)
+
+    itemconfig = itemconfigure
+
+    def get(self, first, last=None):
+        if last is None:
+            return self.row_text(self.items[self._index(first)])
+        return tuple(map(self.row_text, self.items[self._index(first):self._index(last) + 1]))
+
+    def size(self):
+        return len(self.items)
+
+    def see(self, index):
+        idx = self._index(index)
+        if self._view_index(idx) is None:
+            self._sync_selection()
+            self.top = idx if idx < self.top else idx - self.rows + 1
+            self._render()
+
+    def yview(self, *args):
+        if not args:
+            return self._fractions()
+        self._sync_selection()
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.rows
+            self.top += step
+        self._render()
+
+    def _fractions(self):
+        size = len(self.items)
+        if size == 0:
+            return 0.0, 1.0
+        return self.top / size, min(self.top + self.rows, size) / size
+
+    def _update_scrollbar(self):
+        if self._yscrollcommand is not None:
+            self._yscrollcommand(*self._fractions())
+
+    def configure(self, cnf=None, **kwargs):
+        if 'yscrollcommand' in kwargs:
+            self._yscrollcommand = kwargs.pop('yscrollcommand')
+            self._update_scrollbar()
+        return super().configure(cnf, **kwargs)
+
+    config = configure
+
+    def _on_click(self, event):
+        # plain click in extended mode selects only clicked row, so rows
+        # selected before and scrolled out of viewport are forgotten
+        if self.cget('selectmode') == tk.EXTENDED and not event.state & 0x0005:
+            self._selection.clear()
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.yview('scroll', -1, 'units')
+        else:
+            self.yview('scroll', 1, 'units')
+        return 'break'
+
+
+class SearchWindow(ttk.Toplevel):
+    """Window for searching tasks of all days.
+
+    `search(query)` has to return generator of result chunks, lists of
+    (day, task id, text) tuples. Chunks are shown one per event loop
+    iteration, so typing is not blocked by long result lists. Double click
+    or Return on result calls `on_select(day, task_id)`. `on_rebuild()` is
+    called by "Rebuild index" button.
+    """
+
+    def __init__(self, master, search, on_select, on_rebuild, font=None):
+        super().__init__(master=master, title='Search tasks')
+        self.geometry('500x400')
+        self.search = search
+        self.on_select = on_select
+        self._generator = None
+        self._job = None
+
+        frame = ttk.Frame(self)
+        self.query_var = ttk.StringVar()
+        self.query_field = ttk.Entry(frame, font=font, textvariable=self.query_var)
+        self.query_field.pack(side='left', fill='x', expand=True, padx=(0, 10))
+        self.rebuild_button = ttk.Button(
+            frame,
+            text='Rebuild index',
+            bootstyle='secondary-TButton',
+            takefocus=False,
+            command=on_rebuild
+        )
+        self.rebuild_button.pack(side='right')
+        frame.pack(side='top', padx=15, pady=15, fill='x')
+
+        self.results = VirtualListbox(
+            self,
+            row_text=lambda result: f'{result[0]}   {result[2]}',
+            selectmode=tk.SINGLE,
+            height=12,
+            font=font,
+        )
+        self.results.pack(side='top', padx=15, fill='both', expand=True)
+        self.results_scrollbar = tk.Scrollbar(self.results, orient='vertical', command=self.results.yview)
+        self.results.configure(yscrollcommand=self.results_scrollbar.set)
+        self.results_scrollbar.place(relx=1, rely=0, relheight=1, anchor='ne')
+
+        self.status_label = ttk.Label(self, text='Type to search tasks')
+        self.status_label.pack(side='top', padx=15, pady=10, fill='x')
+
+        self.query_var.trace_add('write', lambda *args: self.start_search())
+        self.results.bind('<Double-Button-1>', lambda event: self.select_result())
+        self.results.bind('<Return>', lambda event: self.select_result())
+        self.bind('<KeyPress-Escape>', lambda event: self.destroy())
+        self.query_field.focus_set()
+
+    def start_search(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        self.results.set_items([])
+        self._generator = self.search(self.query_var.get())
+        self._show_next_chunk()
+
+    def _show_next_chunk(self):
+        chunk = next(self._generator, None)
+        if chunk is None:
+            self._job = None
+            self.status_label.configure(text=f'Found {len(self.results.items)} tasks')
+            return
+        self.results.items.extend(chunk)
+        self.results.refresh()
+        self.status_label.configure(text=f'Searching... {len(self.results.items)} tasks')
+        self._job = self.after(1, self._show_next_chunk)
+
+    def set_status(self, text):
+        self.status_label.configure(text=text)
+
+    def select_result(self):
+        selection = self.results.curselection()
+        if selection:
+            day, task_id, _ = self.results.items[selection[0]]
+            self.on_select(day, task_id)
+
+
+class RangeWindow(ttk.Toplevel):
+    """Window with tasks of a week, month, quarter or any range of days.
+
+    `iter_days(start, end)` has to return generator of (day, tasks) for
+    every day of range. It is consumed on worker thread and days with tasks
+    are added to the list as soon as they arrive. Double click or Return on
+    task calls `on_select(day, task_id)`.
+    """
+
+    poll_interval = 10
+    header_style = {'fg': '#ffffff', 'bg': '#7b8a8b', 'selectbackground': '#7b8a8b'}
+    task_style = {'fg': '#212529', 'bg': '#ffffff', 'selectbackground': '#95a5a6'}
+
+    def __init__(self, master, iter_days, on_select, font=None, start_date=None):
+        super().__init__(master=master, title='Tasks in range')
+        self.geometry('560x460')
+        self.iter_days = iter_days
+        self.on_select = on_select
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._job = None
+        self._days = 0
+
+        frame = ttk.Frame(self)
+        self.start_entry = CustomDateEntry(frame, width=10, bootstyle='secondary', firstweekday=0, startdate=start_date)
+        self.start_entry.button_focus_disable()
+        self.start_entry.pack(side='left')
+        ttk.Label(frame, text='-').pack(side='left', padx=5)
+        self.end_entry = CustomDateEntry(frame, width=10, bootstyle='secondary', firstweekday=0, startdate=start_date)
+        self.end_entry.button_focus_disable()
+        self.end_entry.pack(side='left')
+        for text, command in (
+            ('Show', self.show_entered_range),
+            ('Quarter', lambda: self.show_period('quarter')),
+            ('Month', lambda: self.show_period('month')),
+            ('Week', lambda: self.show_period('week')),
+        ):
+            ttk.Button(frame, text=text, bootstyle='secondary-TButton', takefocus=False, command=command).pack(
+                side='right', padx=(5, 0)
+            )
+        frame.pack(side='top', padx=15, pady=15, fill='x')
+
+        self.results = VirtualListbox(
+            self,
+            row_text=self.row_text,
+            row_style=self.row_style,
+            selectmode=tk.SINGLE,
+            height=14,
+            font=font,
         )
-        return chooser.date_selected
-
-
-class CustomDatePickerDialog(DatePickerDialog):
-    def _draw_calendar(self):
-        self._update_widget_bootstyle()
-        self._set_title()
-        self._current_month_days()
-        self.frm_dates = ttk.Frame(self.frm_calendar)
-        self.frm_dates.pack(fill=BOTH, expand=YES)
-
-        for row, weekday_list in enumerate(self.monthdays):
-            for col, day in enumerate(weekday_list):
-                self.frm_dates.columnconfigure(col, weight=1)
-                if day == 0:
-                    ttk.Label(
-                        master=self.frm_dates,
-                        text=self.monthdates[row][col].day,
-                        anchor=CENTER,
-                        padding=5,
-                        bootstyle=INFO,
-                    ).grid(row=row, column=col, sticky=NSEW)
-                else:
-                    if all(
-                        [
-                            day == self.date_selected.day,
-                            self.date.month == self.date_selected.month,
-                            self.date.year == self.date_selected.year,
-                        ]
-                    ):
-                        day_style = "secondary-button"      # change from 'toolbutton' to 'button'
-                    else:
-                        day_style = f"{self.bootstyle}-calendar"
-
-                    def selected(x=row, y=col):
-                        self._on_date_selected(x, y)
-
-                    btn = ttk.Radiobutton(
-                        master=self.frm_dates,
-                        variable=self.datevar,
-                        value=day,
-                        text=day,
-                        bootstyle=day_style,
-                        padding=5,
-                        command=selected,
-                    )
-                    btn.grid(row=row, column=col, sticky=NSEW)
+        self.results.pack(side='top', padx=15, fill='both', expand=True)
+        self.results_scrollbar = tk.Scrollbar(self.results, orient='vertical', command=self.results.yview)
+        self.results.configure(yscrollcommand=self.results_scrollbar.set)
+        self.results_scrollbar.place(relx=1, rely=0, relheight=1, anchor='ne')
+
+        self.status_label = ttk.Label(self, text='')
+        self.status_label.pack(side='top', padx=15, pady=10, fill='x')
+
+        self.results.bind('<Double-Button-1>', lambda event: self.select_result())
+        self.results.bind('<Return>', lambda event: self.select_result())
+        self.bind('<KeyPress-Escape>', lambda event: self.destroy())
+        self.bind('<Destroy>', self._on_destroy)
+        self.show_period('week')
+
+    @staticmethod
+    def row_text(row):
+        if row[0] == 'day':
+            _, day, total, done = row
+            return f'{day.strftime("%a")} {day.strftime(r"%x")}   ({done}/{total} done)'
+        return '    ' + row[2].display()
+
+    def row_style(self, idx):
+        return RangeWindow.header_style if self.results.items[idx][0] == 'day' else RangeWindow.task_style
+
+    def _entry_date(self, entry):
+        return datetime.strptime(entry.entry.get(), r'%x').date()
+
+    def _set_entry_date(self, entry, day):
+        entry.entry.delete(0, END)
+        entry.entry.insert(END, day.strftime(r'%x'))
+
+    def show_period(self, period):
+        # period containing start date
+        day = self._entry_date(self.start_entry)
+        if period == 'week':
+            start = day - timedelta(days=day.weekday())
+            end = start + timedelta(days=6)
+        else:
+            months = 1 if period == 'month' else 3
+            first_month = day.month if period == 'month' else (day.month - 1) // 3 * 3 + 1
+            start = day.replace(month=first_month, day=1)
+            next_month = first_month + months
+            if next_month > 12:
+                end = start.replace(year=start.year + 1, month=next_month - 12) - timedelta(days=1)
+            else:
+                end = start.replace(month=next_month) - timedelta(days=1)
+        self.show_range(start, end)
+
+    def show_entered_range(self):
+        start, end = self._entry_date(self.start_entry), self._entry_date(self.end_entry)
+        self.show_range(min(start, end), max(start, end))
+
+    def show_range(self, start, end):
+        self._set_entry_date(self.start_entry, start)
+        self._set_entry_date(self.end_entry, end)
+        self.stop_loading()
+        self.results.set_items([])
+        self._days = 0
+        self._stop = threading.Event()
+        self._queue = queue.Queue()
+        threading.Thread(
+            target=self._load,
+            args=(self.iter_days(start, end), self._queue, self._stop),
+            daemon=True
+        ).start()
+        self.status_label.configure(text='Loading...')
+        self._poll()
+
+    @staticmethod
+    def _load(days, day_queue, stop):
+        # runs on worker thread; None marks end of range
+        try:
+            for day, tasks in days:
+                if stop.is_set():
+                    break
+                if tasks:
+                    day_queue.put((day, tasks))
+        finally:
+            days.close()
+            day_queue.put(None)
+
+    def _poll(self):
+        self._job = None
+        added = False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                if added:
+                    self.results.refresh()
+                self.status_label.configure(text=f'{self._task_count()} tasks in {self._days} days')
+                return
+            day, tasks = item
+            self.results.items.append(('day', day, len(tasks), sum(task.done for task in tasks)))
+            self.results.items.extend(('task', day, task) for task in tasks)
+            self._days += 1
+            added = True
+        if added:
+            self.results.refresh()
+            self.status_label.configure(text=f'Loading... {self._task_count()} tasks')
+        self._job = self.after(RangeWindow.poll_interval, self._poll)
+
+    def _task_count(self):
+        return len(self.results.items) - self._days
+
+    def stop_loading(self):
+        self._stop.set()
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.stop_loading()
+
+    def select_result(self):
+        selection = self.results.curselection()
+        if selection and self.results.items[selection[0]][0] == 'task':
+            _, day, task = self.results.items[selection[0]]
+            self.on_select(day.strftime('%Y-%m-%d'), task.id)
+
+
+class StatsWindow(ttk.Toplevel):
+    """Window with call counts and times of instrumented actions.
+
+    `rows()` has to return (name, count, average ms, recent p95 ms, max ms)
+    tuples; table is refreshed every `refresh_interval` ms while window is
+    open.
+    """
+
+    refresh_interval = 1000
+    columns = ('count', 'average', 'p95', 'max')
+
+    def __init__(self, master, rows):
+        super().__init__(master=master, title='Performance stats')
+        self.geometry('620x360')
+        self.rows = rows
+        self.table = ttk.Treeview(self, columns=StatsWindow.columns, height=15)
+        self.table.heading('#0', text='action')
+        self.table.column('#0', width=300)
+        for column, heading in zip(StatsWindow.columns, ('calls', 'avg ms', 'recent p95 ms', 'max ms')):
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=75, anchor='e')
+        self.table.pack(side='top', padx=10, pady=10, fill='both', expand=True)
+        self.bind('<KeyPress-Escape>', lambda event: self.destroy())
+        self.refresh()
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        self.table.delete(*self.table.get_children())
+        for name, count, average, p95, maximum in self.rows():
+            self.table.insert('', 'end', text=name, values=(count, f'{average:.2f}', f'{p95:.2f}', f'{maximum:.2f}'))
+        self.after(StatsWindow.refresh_interval, self.refresh)
@@ -0,0 +1,148 @@
+"""Filtered and sorted view of tasks of one day."""
+
+
+# sort mode: label shown in app
+SORT_MODES = {
+    'position': 'Added order',
+    'alphabetical': 'Alphabetical',
+    'done_last': 'Done last',
+    'created': 'Created time',
+}
+# status filter: label shown in app
+STATUS_FILTERS = {
+    'all': 'All',
+    'pending': 'Pending',
+    'done': 'Done',
+}
+
+
+class DayView:
+    """Tasks of a day matching query and status filter, in sort mode order.
+
+    `items` are stored `tasks` followed by `occurrences` of recurring tasks.
+    `indices` are positions in `items` of shown tasks, in shown order (None
+    when view is not `active` and items are shown as they are, occurrences
+    as trailing rows). Query is
+    matched as case-insensitive substring. When query is refined (new query
+    contains the previous one), only tasks shown so far are checked again.
+
+    Lower-case task texts and sort order are cached until tasks are
+    changed; after a change `refresh` (active view) or `invalidate`,
+    `task_inserted` and `task_deleted` (view not active, rows are updated
+    one by one) have to be called.
+    """
+
+    def __init__(self, tasks=None, occurrences=()):
+        self.tasks = tasks if tasks is not None else []
+        self.occurrences = list(occurrences)
+        self.items = self.tasks
+        self.query = ''
+        self.status = 'all'
+        self.sort = 'position'
+        self.indices = None
+        self._folded = None
+        self._order = None
+
+    @property
+    def active(self):
+        return self.query != '' or self.status != 'all' or self.sort != 'position'
+
+    def set_tasks(self, tasks, occurrences=()):
+        self.tasks = tasks
+        self.occurrences = list(occurrences)
+        self.refresh()
+
+    def refresh(self):
+        """Sort and filter all tasks again"""
+        self.items = self.tasks + self.occurrences if self.occurrences else self.tasks
+        self.invalidate()
+        self._filter(None)
+
+    def invalidate(self):
+        """Drop cached texts and sort order after tasks were changed"""
+        self._folded = None
+        self._order = None
+
+    def task_inserted(self, idx):
+        """Update items after task was inserted into tasks at idx"""
+        if self.items is not self.tasks:
+            self.items.insert(idx, self.tasks[idx])
+        self.invalidate()
+
+    def task_deleted(self, idx):
+        """Update items after task was deleted from tasks at idx"""
+        if self.items is not self.tasks:
+            del self.items[idx]
+        self.invalidate()
+
+    def set_query(self, query):
+        query = query.casefold()
+        narrowing = self.indices is not None and self.query in query
+        self.query = query
+        self._filter(self.indices if narrowing else None)
+
+    def set_status(self, status):
+        narrowing = self.indices is not None and self.status == 'all'
+        self.status = status
+        self._filter(self.indices if narrowing else None)
+
+    def set_sort(self, sort):
+        self.sort = sort
+        self._order = None
+        self._filter(None)
+
+    def _folded_texts(self):
+        if self._folded is None:
+            self._folded = [task.text.casefold() for task in self.items]
+        return self._folded
+
+    def _sorted_order(self):
+        if self._order is None:
+            tasks = self.items
+            if self.sort == 'alphabetical':
+                folded = self._folded_texts()
+                self._order = sorted(range(len(tasks)), key=folded.__getitem__)
+            elif self.sort == 'done_last':
+                self._order = sorted(range(len(tasks)), key=lambda idx: tasks[idx].done)
+            elif self.sort == 'created':
+                self._order = sorted(range(len(tasks)), key=lambda idx: tasks[idx].created)
+            else:
+                self._order = range(len(tasks))
+        return self._order
+
+    def _filter(self, candidates):
+        # candidates are indices shown before query was refined, or None
+        if not self.active:
+            self.indices = None
+            return
+        if candidates is None:
+            candidates = self._sorted_order()
+        tasks = self.items
+        if self.query:
+            folded = self._folded_texts()
+            query = self.query
+            candidates = [idx for idx in candidates if query in folded[idx]]
+        if self.status != 'all':
+            done = self.status == 'done'
+            candidates = [idx for idx in candidates if tasks[idx].done == done]
+        self.indices = list(candidates)
+
+    def rows(self):
+        """Shown tasks; the items list itself when view is not active"""
+        if self.indices is None:
+            return self.items
+        tasks = self.items
+        return [tasks[idx] for idx in self.indices]
+
+    def task_index(self, row):
+        """Position in items of shown row"""
+        return row if self.indices is None else self.indices[row]
+
+    def row_index(self, task_index):
+        """Row showing task at position in items, or None when it is filtered out"""
+        if self.indices is None:
+            return task_index
+        try:
+            return self.indices.index(task_index)
+        except ValueError:
+            return None
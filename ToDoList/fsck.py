@@ -0,0 +1,337 @@
+"""Check and repair of all month files in data directory.
+
+    python -m ToDoList fsck --output repaired_data
+
+Every month (month file with its journal, or archived copy of the month)
+is read and checked on a process pool:
+
+- dates parse and belong to the month of the file,
+- tasks are well-formed records, current (id, text, done, created,
+  updated) tuples or old [text, done] lists,
+- text has no stray check mark ('✓ ' is part of text only in old records
+  of done tasks),
+- journal replays cleanly.
+
+Workers also count and tokenize tasks, so search index and day summary
+are rebuilt in the same pass. With `output` directory, repaired months
+(journal merged, records upgraded, bad records dropped, tasks of misplaced
+dates moved to their month) are written there together with rebuilt
+indexes, and it can replace data directory. Without it only the indexes
+of data directory are rebuilt; month files are never changed, so old
+records, which get their ids only when month is upgraded, are counted but
+left out of search index, and index is marked out of date, so the app (or
+`reindex`) upgrades months and indexes them.
+"""
+import os
+import os.path
+import pickle
+import re
+import shutil
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from .core import index_marker_path
+from .model import CHECK_MARK, new_task_id
+from .recurring import RecurringTasks, recurring_file_path
+from .search import SearchIndex, index_file_path, tokenize
+from .storage import (
+    MonthArchive,
+    apply_record,
+    archive_file_path,
+    journal_file_path,
+    month_file_path,
+    parse_date,
+    write_file_atomic,
+)
+from .summary import DaySummary, summary_file_path
+
+
+MONTH_PATTERN = re.compile(r'\d{4}_\d{2}')
+
+
+class MonthCheck:
+    """Result of checking one month, sent back from worker process.
+
+    `misplaced` holds repaired records of dates of other months
+    {month: {date: [record, ...]}}, `counts` day summary counts
+    {'YYYY-MM-DD': [total, done]}, `texts` and `postings` search index
+    entries of all valid tasks, `unindexed` number of old records left out
+    of search index.
+    """
+
+    def __init__(self, month):
+        self.month = month
+        self.tasks = 0
+        self.problems = []
+        self.misplaced = {}
+        self.counts = {}
+        self.texts = {}
+        self.postings = {}
+        self.unindexed = 0
+
+
+def stored_months(directory):
+    """Return (hot months, archived months, problems) of data directory"""
+    hot, problems = set(), []
+    for name in os.listdir(directory):
+        if name.startswith('task_data_') and name.endswith(('.dat', '.journal')):
+            month = name[len('task_data_'):].rsplit('.', 1)[0]
+            if MONTH_PATTERN.fullmatch(month):
+                hot.add(month)
+            else:
+                problems.append(f'{name}: not a month file name, skipped')
+    archived = set()
+    if os.path.isfile(archive_file_path(directory)):
+        try:
+            archived = set(MonthArchive(archive_file_path(directory)).months())
+        except Exception as e:
+            problems.append(f'archive is unreadable ({type(e).__name__}: {e}), archived months skipped')
+    # month file takes precedence over archived copy, as in PickleBackend
+    return sorted(hot), sorted(archived - hot), problems
+
+
+def replay_journal(path, checksum, data_dict, problems):
+    """Apply records of journal written against snapshot with checksum"""
+    with open(path, 'rb') as f:
+        try:
+            header = pickle.load(f)
+        except Exception:
+            problems.append('journal header is unreadable, journal ignored')
+            return
+        if header != ('base', checksum):
+            # journal already merged into month file
+            return
+        count = 0
+        valid_size = f.tell()
+        while True:
+            try:
+                record = pickle.load(f)
+            except Exception as e:
+                if not isinstance(e, EOFError) or f.tell() != valid_size:
+                    # app drops the rest of journal the same way when month is loaded
+                    problems.append(f'journal record {count + 1} is truncated or damaged, rest of journal ignored')
+                return
+            try:
+                apply_record(data_dict, record)
+            except (TypeError, ValueError, IndexError, KeyError) as e:
+                problems.append(f'journal record {count + 1} cannot be applied ({e}), skipped')
+            count += 1
+            valid_size = f.tell()
+
+
+def read_month(directory, month, archived):
+    """Return stored month dictionary of month file with its journal (or archived month) and problems"""
+    problems = []
+    if archived:
+        try:
+            return MonthArchive(archive_file_path(directory)).load(month), problems
+        except Exception as e:
+            return {}, [f'archived copy is unreadable ({type(e).__name__}: {e}), its tasks are lost']
+    data_dict, checksum = {}, None
+    path = month_file_path(directory, month)
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        checksum = zlib.crc32(raw)
+        # truncated or damaged pickle raises almost any exception
+        try:
+            data_dict = pickle.loads(raw)
+        except Exception as e:
+            problems.append(f'month file is unreadable ({type(e).__name__}: {e}), its tasks are lost')
+        if not isinstance(data_dict, dict):
+            problems.append('month file does not hold dictionary of days, its tasks are lost')
+            data_dict = {}
+    if os.path.isfile(journal_file_path(directory, month)):
+        replay_journal(journal_file_path(directory, month), checksum, data_dict, problems)
+    return data_dict, problems
+
+
+def check_record(record, report):
+    """Return record as current (id, text, done, created, updated) tuple, or None if it cannot be repaired"""
+    if not isinstance(record, (list, tuple)) or len(record) not in (2, 5):
+        report(f'malformed record {record!r:.60}, dropped')
+        return None
+    legacy = len(record) == 2
+    if legacy:
+        text, done = record
+        task_id, created, updated = new_task_id(), 0.0, 0.0
+    else:
+        task_id, text, done, created, updated = record
+    if not isinstance(text, str):
+        report(f'text is not string {text!r:.60}, dropped')
+        return None
+    if not isinstance(done, bool):
+        if done not in (0, 1):
+            report(f'done is not bool {done!r:.60}, dropped')
+            return None
+        report('done is not bool, converted')
+        done = bool(done)
+    if not legacy:
+        if not isinstance(task_id, int) or isinstance(task_id, bool):
+            report('id is not integer, new id given')
+            task_id = new_task_id()
+        if not isinstance(created, (int, float)) or not isinstance(updated, (int, float)):
+            report('created or updated time is not number, reset')
+            created = created if isinstance(created, (int, float)) else 0.0
+            updated = updated if isinstance(updated, (int, float)) else created
+    has_mark = text.startswith(CHECK_MARK)
+    if legacy and has_mark != done:
+        # old records have check mark in text of done tasks only; done flag is kept
+        report(f'check mark does not match done={done}')
+    elif not legacy and has_mark:
+        report('stray check mark in text, removed')
+    if has_mark:
+        text = text[len(CHECK_MARK):]
+    return task_id, text, done, float(created), float(updated)
+
+
+def check_month(directory, month, archived, output=None):
+    """Check and repair one month; write repaired month to output directory (in worker process)"""
+    result = MonthCheck(month)
+    data_dict, result.problems = read_month(directory, month, archived)
+    repaired = {}
+    ids = set()
+    for date, records in data_dict.items():
+        try:
+            day = parse_date(date)
+        except (TypeError, ValueError):
+            result.problems.append(f'{date!r:.40} is not a date, its tasks are dropped')
+            continue
+        if not isinstance(records, list):
+            result.problems.append(f'{date}: tasks are not a list, dropped')
+            continue
+        day_month = day.strftime('%Y_%m')
+        iso_day = day.strftime('%Y-%m-%d')
+        if day_month != month:
+            result.problems.append(f'{date} does not belong to month, {len(records)} tasks moved to {day_month}')
+        tasks = []
+        for position, record in enumerate(records, 1):
+            legacy = isinstance(record, (list, tuple)) and len(record) == 2
+            record = check_record(record, lambda problem: result.problems.append(f'{date} task {position}: {problem}'))
+            if record is None:
+                continue
+            if record[0] in ids:
+                result.problems.append(f'{date} task {position}: duplicate id, new id given')
+                record = (new_task_id(),) + record[1:]
+            ids.add(record[0])
+            tasks.append(record)
+            if legacy and output is None:
+                # ids given here are not stored anywhere
+                result.unindexed += 1
+                continue
+            result.texts[record[0]] = (iso_day, record[1])
+            for token in tokenize(record[1]):
+                result.postings.setdefault(token, []).append(record[0])
+        if not tasks:
+            continue
+        result.tasks += len(tasks)
+        counts = result.counts.setdefault(iso_day, [0, 0])
+        counts[0] += len(tasks)
+        counts[1] += sum(record[2] for record in tasks)
+        if day_month == month:
+            repaired.setdefault(date, []).extend(tasks)
+        else:
+            result.misplaced.setdefault(day_month, {}).setdefault(date, []).extend(tasks)
+    if result.unindexed:
+        result.problems.append(f'{result.unindexed} old records are not upgraded and not indexed, app or reindex rebuilds indexes')
+    if output is not None and repaired:
+        write_file_atomic(month_file_path(output, month), pickle.dumps(repaired))
+    return result
+
+
+def add_misplaced(output, misplaced):
+    # tasks of dates found in month files of other months are appended to their month
+    for month, days in misplaced.items():
+        path = month_file_path(output, month)
+        data_dict = {}
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                data_dict = pickle.load(f)
+        for date, records in days.items():
+            data_dict.setdefault(date, []).extend(records)
+        write_file_atomic(path, pickle.dumps(data_dict))
+
+
+def check_data_dir(directory, output=None, workers=None, out=sys.stdout):
+    """Check all months of data directory; return number of problems found"""
+    if output is not None:
+        if os.path.abspath(output) == os.path.abspath(directory):
+            raise ValueError('Repaired copy cannot be written to data directory itself')
+        if os.path.isdir(output) and os.listdir(output):
+            raise ValueError(f'Output directory {output} is not empty')
+        os.makedirs(output, exist_ok=True)
+    start = time.perf_counter()
+    hot, archived, problems = stored_months(directory)
+    for problem in problems:
+        print(problem, file=out)
+    months = hot + archived
+    archived_months = set(archived)
+    target = output if output is not None else directory
+    search_index = SearchIndex(index_file_path(target))
+    day_summary = DaySummary(summary_file_path(target))
+    misplaced = {}
+    tasks = 0
+    unindexed = 0
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            check_month,
+            repeat(directory),
+            months,
+            [month in archived_months for month in months],
+            repeat(output),
+            chunksize=4
+        )
+        for result in results:
+            for problem in result.problems:
+                print(f'{result.month}: {problem}', file=out)
+            problems.extend(result.problems)
+            tasks += result.tasks
+            unindexed += result.unindexed
+            for month, days in result.misplaced.items():
+                for date, records in days.items():
+                    misplaced.setdefault(month, {}).setdefault(date, []).extend(records)
+            for task_id, entry in result.texts.items():
+                if task_id in search_index.tasks:
+                    problem = f'task id {task_id} is used on {search_index.tasks[task_id][0]} and {entry[0]}'
+                    print(f'{result.month}: {problem}', file=out)
+                    problems.append(problem)
+            search_index.tasks.update(result.texts)
+            for token, ids in result.postings.items():
+                search_index.postings.setdefault(token, set()).update(ids)
+            for day, (total, done) in result.counts.items():
+                counts = day_summary.months.setdefault(f'{day[:4]}_{day[5:7]}', {}).setdefault(day, [0, 0])
+                counts[0] += total
+                counts[1] += done
+    if output is not None:
+        add_misplaced(output, misplaced)
+    search_index.save()
+    day_summary.save()
+    if unindexed:
+        # app rebuilds indexes of data directory on start
+        with open(index_marker_path(directory), 'wb'):
+            pass
+
+    # recurring tasks are stored in single small file and checked here
+    path = recurring_file_path(directory)
+    if os.path.isfile(path):
+        try:
+            RecurringTasks.load(path)
+        except Exception as e:
+            problem = f'recurring tasks file is unreadable ({type(e).__name__}: {e})'
+            print(problem, file=out)
+            problems.append(problem)
+        else:
+            if output is not None:
+                shutil.copyfile(path, recurring_file_path(output))
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(
+        f'Checked {len(months)} months, {tasks} tasks in {elapsed:.2f} s '
+        f'({tasks / elapsed:,.0f} tasks/s, {workers} processes): {len(problems)} problems',
+        file=out
+    )
+    return len(problems)
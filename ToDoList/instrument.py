@@ -0,0 +1,138 @@
+"""Opt-in timers and counters of app actions and storage calls.
+
+When `enabled`, methods passed to `wrap_methods` are replaced (on the
+instance) by wrappers which count calls and measure their time. Every call
+is also kept as Chrome trace event, so collected data can be exported with
+`export_trace` and opened in chrome://tracing or Perfetto.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+enabled = False
+# number of recent call times kept for each name (shown in stats window)
+recent_size = 100
+# max number of trace events kept (oldest are dropped)
+trace_size = 200000
+
+stats = {}
+trace_events = deque(maxlen=trace_size)
+_start_time = time.perf_counter()
+_lock = threading.Lock()
+
+
+class Stat:
+    """Counter and call times of one instrumented name"""
+
+    __slots__ = ('count', 'total', 'max', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=recent_size)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.recent.append(duration)
+
+    def recent_p95(self):
+        if len(self.recent) < 2:
+            return self.max
+        # nearest-rank percentile (statistics.quantiles needs Python 3.8)
+        recent = sorted(self.recent)
+        return recent[min(len(recent) - 1, int(len(recent) * 0.95))]
+
+
+def add_event(name, category, start, duration):
+    """Count call of name which started at `start` (perf_counter) and took `duration` seconds"""
+    with _lock:
+        if name not in stats:
+            stats[name] = Stat()
+        stats[name].add(duration)
+        trace_events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - _start_time) * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        })
+
+
+def timed(func, name, category):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add_event(name, category, start, time.perf_counter() - start)
+    return wrapper
+
+
+def wrap_methods(obj, names, category, prefix=None):
+    """Replace methods of obj by timed wrappers when instrumentation is enabled"""
+    if not enabled:
+        return
+    prefix = prefix or type(obj).__name__
+    for name in names:
+        setattr(obj, name, timed(getattr(obj, name), f'{prefix}.{name}', category))
+
+
+def export_trace(path):
+    """Write collected events as Chrome trace JSON"""
+    with _lock:
+        events = list(trace_events)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def rows():
+    """Stats as (name, count, average ms, recent p95 ms, max ms) sorted by total time"""
+    with _lock:
+        items = sorted(stats.items(), key=lambda item: item[1].total, reverse=True)
+        return [
+            (name, stat.count, stat.total / stat.count * 1000, stat.recent_p95() * 1000, stat.max * 1000)
+            for name, stat in items
+        ]
+
+
+class StallDetector:
+    """Detect event loop stalls with after() timer.
+
+    Timer is scheduled every `interval` ms; when it runs more than
+    `threshold` ms late, event loop was blocked and the delay is recorded
+    as 'event loop stall'.
+    """
+
+    interval = 50
+    threshold = 100
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._expected = None
+        self._job = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval / 1000
+        self._job = self.widget.after(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        delay = now - self._expected
+        if delay * 1000 > self.threshold:
+            add_event('event loop stall', 'stall', self._expected, delay)
+        self.start()
+
+    def stop(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
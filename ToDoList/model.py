@@ -0,0 +1,79 @@
+import time
+import uuid
+
+
+CHECK_MARK = '✓ '
+
+
+def new_task_id():
+    # random 63-bit id, fits SQLite INTEGER column
+    return uuid.uuid4().int >> 65
+
+
+class Task:
+    """Single task.
+
+    Text is stored without check mark; check mark of completed task is
+    added only when task is displayed (`display`).
+    """
+
+    __slots__ = ('id', 'text', 'done', 'created', 'updated')
+
+    def __init__(self, text, done=False, created=None, updated=None, task_id=None):
+        self.id = new_task_id() if task_id is None else task_id
+        self.text = text
+        self.done = done
+        self.created = time.time() if created is None else created
+        self.updated = self.created if updated is None else updated
+
+    def __repr__(self):
+        return f'Task({self.text!r}, done={self.done})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Task):
+            return NotImplemented
+        return self.to_record() == other.to_record()
+
+    def display(self):
+        return CHECK_MARK + self.text if self.done else self.text
+
+    def set_text(self, text):
+        self.text = text
+        self.updated = time.time()
+
+    def set_done(self, done):
+        self.done = done
+        self.updated = time.time()
+
+    def copy(self):
+        return Task(self.text, self.done, self.created, self.updated, self.id)
+
+    def to_record(self):
+        """Plain tuple stored in files: (id, text, done, created, updated)"""
+        return self.id, self.text, self.done, self.created, self.updated
+
+    @classmethod
+    def from_record(cls, record):
+        """Create task from stored tuple, upgrading old [text, done] records"""
+        if len(record) == 2:
+            text, done = record
+            if done and text.startswith(CHECK_MARK):
+                text = text[len(CHECK_MARK):]
+            return cls(text, done, created=0.0)
+        task_id, text, done, created, updated = record
+        return cls(text, done, created, updated, task_id)
+
+
+def tasks_from_records(data_dict):
+    """Convert stored month dictionary {date: [record, ...]} to {date: [Task, ...]}"""
+    return {date: [Task.from_record(record) for record in records] for date, records in data_dict.items()}
+
+
+def tasks_to_records(data_dict):
+    """Convert month dictionary {date: [Task, ...]} to stored {date: [record, ...]}, skipping empty days"""
+    return {date: [task.to_record() for task in tasks] for date, tasks in data_dict.items() if tasks}
+
+
+def is_legacy_month(data_dict):
+    """Check if stored month dictionary has old [text, done] records"""
+    return any(len(record) == 2 for records in data_dict.values() for record in records)
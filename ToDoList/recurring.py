@@ -0,0 +1,183 @@
+import calendar
+import os.path
+import pickle
+import threading
+import time
+from datetime import date as date_type
+
+from .model import Task, new_task_id
+from .storage import write_file_atomic
+
+
+# rule kind: label shown in app
+RULE_KINDS = {
+    'daily': 'Daily',
+    'weekdays': 'Weekdays',
+    'weekly': 'Weekly',
+    'monthly': 'Monthly',
+    'every': 'Every N days',
+}
+
+
+def recurring_file_path(directory):
+    return os.path.join(directory, 'recurring_tasks.dat')
+
+
+class Rule:
+    """Recurring task repeated from `start` day (to `end` day, if set)"""
+
+    __slots__ = ('id', 'text', 'kind', 'start', 'interval', 'end', 'created')
+
+    def __init__(self, text, kind, start, interval=1, end=None, created=None, rule_id=None):
+        if kind not in RULE_KINDS:
+            raise ValueError(f'Unknown recurring rule: {kind}')
+        self.id = new_task_id() if rule_id is None else rule_id
+        self.text = text
+        self.kind = kind
+        self.start = start
+        self.interval = max(int(interval), 1)
+        self.end = end
+        self.created = time.time() if created is None else created
+
+    def occurs(self, day):
+        if day < self.start or (self.end is not None and day > self.end):
+            return False
+        if self.kind == 'daily':
+            return True
+        if self.kind == 'weekdays':
+            return day.weekday() < 5
+        if self.kind == 'weekly':
+            return day.weekday() == self.start.weekday()
+        if self.kind == 'monthly':
+            # rule started on 31st occurs on last day of shorter months
+            return day.day == min(self.start.day, calendar.monthrange(day.year, day.month)[1])
+        return (day - self.start).days % self.interval == 0
+
+    def to_record(self):
+        return self.id, self.text, self.kind, self.start.toordinal(), self.interval, \
+            None if self.end is None else self.end.toordinal(), self.created
+
+    @classmethod
+    def from_record(cls, record):
+        rule_id, text, kind, start, interval, end, created = record
+        return cls(
+            text,
+            kind,
+            date_type.fromordinal(start),
+            interval,
+            None if end is None else date_type.fromordinal(end),
+            created,
+            rule_id
+        )
+
+
+class Occurrence(Task):
+    """Task of recurring rule on one day"""
+
+    __slots__ = ('rule_id', 'day')
+
+    def __init__(self, rule, day, done=False, text=None, updated=None):
+        super().__init__(rule.text if text is None else text, done, rule.created, updated, rule.id ^ day.toordinal())
+        self.rule_id = rule.id
+        self.day = day
+
+    def display(self):
+        return '↻ ' + super().display()
+
+
+class RecurringTasks:
+    """Recurring task rules with sparse per-occurrence changes.
+
+    Rules are stored once and expanded only for requested day
+    (`occurrences`), so stored size and loading time depend on number of
+    rules, not on number of days they repeat on. Completion, text change or
+    skipping of single occurrence is stored as override
+    {(rule id, day ordinal): (done, text or None, skipped, updated)}.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.rules = {}
+        self.overrides = {}
+        self.changed = False
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path):
+        """Load rules from file; return None if file does not exist"""
+        if not os.path.isfile(path):
+            return None
+        recurring = cls(path)
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        recurring.rules = {record[0]: Rule.from_record(record) for record in data['rules']}
+        recurring.overrides = data['overrides']
+        return recurring
+
+    def dumps(self):
+        with self._lock:
+            return pickle.dumps({
+                'rules': [rule.to_record() for rule in self.rules.values()],
+                'overrides': dict(self.overrides),
+            })
+
+    def save(self):
+        write_file_atomic(self.path, self.dumps())
+        self.changed = False
+
+    def add_rule(self, text, kind, start, interval=1):
+        rule = Rule(text, kind, start, interval)
+        with self._lock:
+            self.rules[rule.id] = rule
+            self.changed = True
+        return rule
+
+    def end_rule(self, rule_id, last_day):
+        """Stop repeating rule after last_day (earlier occurrences stay)"""
+        with self._lock:
+            rule = self.rules[rule_id]
+            if last_day < rule.start:
+                del self.rules[rule_id]
+                self.overrides = {key: value for key, value in self.overrides.items() if key[0] != rule_id}
+            else:
+                rule.end = last_day
+            self.changed = True
+
+    def occurrences(self, day):
+        """Occurrences of all rules on day (`datetime.date`), skipped ones excluded"""
+        result = []
+        ordinal = day.toordinal()
+        with self._lock:
+            for rule in self.rules.values():
+                if not rule.occurs(day):
+                    continue
+                override = self.overrides.get((rule.id, ordinal))
+                if override is None:
+                    result.append(Occurrence(rule, day))
+                    continue
+                done, text, skipped, updated = override
+                if not skipped:
+                    result.append(Occurrence(rule, day, done, text, updated))
+        return result
+
+    def _override(self, occurrence, skipped=False):
+        with self._lock:
+            text = None if occurrence.text == self.rules[occurrence.rule_id].text else occurrence.text
+            key = (occurrence.rule_id, occurrence.day.toordinal())
+            if not occurrence.done and text is None and not skipped:
+                # occurrence is as generated by rule again
+                self.overrides.pop(key, None)
+            else:
+                self.overrides[key] = (occurrence.done, text, skipped, occurrence.updated)
+            self.changed = True
+
+    def set_done(self, occurrence, done):
+        occurrence.set_done(done)
+        self._override(occurrence)
+
+    def set_text(self, occurrence, text):
+        occurrence.set_text(text)
+        self._override(occurrence)
+
+    def skip(self, occurrence):
+        self._override(occurrence, skipped=True)
@@ -0,0 +1,158 @@
+import bisect
+import os.path
+import pickle
+import re
+import threading
+
+from .storage import iso_date, write_file_atomic
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def index_file_path(directory):
+    return os.path.join(directory, 'search_index.dat')
+
+
+def tokenize(text):
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+class SearchIndex:
+    """Inverted index of task texts across all months.
+
+    `postings` maps token to set of task ids and `tasks` maps task id to
+    (day, text), where day is canonical 'YYYY-MM-DD' date. Index is updated
+    with `index_task` and `remove_task` when tasks change and saved to
+    single pickle file; `rebuild` creates it again from storage backend.
+    """
+
+    version = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        self.postings = {}
+        self.tasks = {}
+        self.changed = False
+        self._sorted_tokens = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path):
+        """Load index from file; return None if file is missing or unreadable"""
+        index = cls(path)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if data.get('version') != cls.version:
+            return None
+        index.postings = data['postings']
+        index.tasks = data['tasks']
+        return index
+
+    def dumps(self):
+        with self._lock:
+            return pickle.dumps({'version': self.version, 'postings': self.postings, 'tasks': self.tasks})
+
+    def save(self):
+        write_file_atomic(self.path, self.dumps())
+        self.changed = False
+
+    def index_task(self, date, task):
+        """Add task of date (locale '%x' format) or update already indexed task"""
+        with self._lock:
+            self._remove(task.id)
+            self.tasks[task.id] = (iso_date(date), task.text)
+            for token in tokenize(task.text):
+                if token not in self.postings:
+                    self.postings[token] = set()
+                    self._sorted_tokens = None
+                self.postings[token].add(task.id)
+            self.changed = True
+
+    def remove_task(self, task_id):
+        with self._lock:
+            self._remove(task_id)
+            self.changed = True
+
+    def _remove(self, task_id):
+        if task_id not in self.tasks:
+            return
+        _, text = self.tasks.pop(task_id)
+        for token in tokenize(text):
+            ids = self.postings.get(token)
+            if ids is not None:
+                ids.discard(task_id)
+                if not ids:
+                    del self.postings[token]
+                    self._sorted_tokens = None
+
+    def clear(self):
+        with self._lock:
+            self.postings = {}
+            self.tasks = {}
+            self._sorted_tokens = None
+            self.changed = True
+
+    def rebuild(self, storage):
+        """Index all tasks of all months stored in storage backend"""
+        self.clear()
+        for month in storage.months():
+            for date, tasks in storage.load_month(month).items():
+                for task in tasks:
+                    self.index_task(date, task)
+
+    def _prefix_tokens(self, prefix):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        tokens = self._sorted_tokens
+        start = bisect.bisect_left(tokens, prefix)
+        end = bisect.bisect_left(tokens, prefix + '\U0010ffff', start)
+        return tokens[start:end]
+
+    def search(self, query, chunk_size=200):
+        """Generate lists of (day, task id, text) matching all words of query.
+
+        Last word of query matches as prefix, so results follow typing.
+        Results are generated in chunks as they are found, so the first
+        chunk is ready at once even for query matching most of the tasks.
+        """
+        words = TOKEN_PATTERN.findall(query.lower())
+        if not words:
+            return
+        *complete, prefix = words
+        with self._lock:
+            required = sorted((self.postings.get(word, set()) for word in complete), key=len)
+            if required:
+                # candidates are tasks with the rarest complete word
+                sources = [list(required[0])]
+                required = required[1:]
+            else:
+                sources = self._prefix_tokens(prefix)
+        seen = set()
+        chunk = []
+        for source in sources:
+            with self._lock:
+                if complete:
+                    ids = source
+                else:
+                    ids = list(self.postings.get(source, ()))
+                for task_id in ids:
+                    if task_id in seen or task_id not in self.tasks:
+                        continue
+                    seen.add(task_id)
+                    if not all(task_id in ids_set for ids_set in required):
+                        continue
+                    day, text = self.tasks[task_id]
+                    if complete and not any(token.startswith(prefix) for token in tokenize(text)):
+                        continue
+                    chunk.append((day, task_id, text))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,531 @@
+"""Local task server sharing one in-memory task store between clients.
+
+    python -m ToDoList serve
+
+Server owns `TaskStore` (with write-behind thread, so writes of all clients
+are batched) and serves app windows and scripts over Unix domain socket
+`todo_server.sock` in data directory. Messages are JSON lines: request
+{"id": 1, "method": "tasks", "params": ["2024-05-15"]}, reply
+{"id": 1, "result": ...} or {"id": 1, "error": "..."}. After a change
+every other client gets {"event": "changed", "dates": [...]} (dates None:
+any day, e.g. recurring task was added).
+
+Dates are sent as 'YYYY-MM-DD' and tasks as records [id, text, done,
+created, updated]. Tasks are changed by id, so a client showing older
+version of a day still changes the right tasks.
+
+`RemoteStore` is client with the methods of `TaskStore` used by the app;
+app uses it instead of its own store when server is running.
+"""
+import json
+import os
+import os.path
+import queue
+import socket
+import threading
+from datetime import date as date_type
+from types import SimpleNamespace
+
+from .core import date_key, days_by_month, parse_day
+from .model import Task
+from .recurring import Occurrence, Rule
+from .storage import iso_date, locale_date
+
+
+def socket_file_path(directory):
+    return os.path.join(directory, 'todo_server.sock')
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def update_task(task, record):
+    # set task to state of its record returned by server
+    _, task.text, task.done, task.created, task.updated = record
+
+
+def server_running(path):
+    """Check if server accepts connections on socket file"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class ServerConnection:
+    """Connection of one client; requests are read and answered on its own thread"""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        # undo of each client reverts only its own changes
+        self.undo_stack = []
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        with self._send_lock:
+            self.sock.sendall(encode(message))
+
+    def serve(self):
+        try:
+            for line in self.sock.makefile('rb'):
+                request = json.loads(line)
+                try:
+                    result = self.server.handle(self, request['method'], request.get('params', []))
+                except Exception as e:
+                    self.send({'id': request['id'], 'error': f'{type(e).__name__}: {e}'})
+                else:
+                    self.send({'id': request['id'], 'result': result})
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.server.disconnected(self)
+            self.sock.close()
+
+
+class TaskServer:
+    """Serves tasks of one `TaskStore` to clients connected to Unix domain socket.
+
+    Requests of all clients are handled one at a time (`_lock`), every
+    `do_<method>` returns result and list of changed days ('YYYY-MM-DD', or
+    None for any day), which are sent to other clients.
+    """
+
+    # max number of search results sent to client
+    search_limit = 5000
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._socket = None
+
+    def bind(self):
+        if os.path.exists(self.path):
+            if server_running(self.path):
+                raise RuntimeError(f'Task server is already running ({self.path})')
+            # socket file left by server which did not exit cleanly
+            os.remove(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only user running server can connect
+        umask = os.umask(0o077)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen()
+        self._socket = sock
+
+    def serve_forever(self):
+        while True:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                # socket was closed
+                return
+            connection = ServerConnection(self, sock)
+            with self._lock:
+                self.connections.add(connection)
+            threading.Thread(target=connection.serve, daemon=True).start()
+
+    def close(self, timeout=None):
+        """Stop accepting clients, remove socket file and write all changes"""
+        if self._socket is not None:
+            # wakes accept() of serve_forever running on other thread
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self._lock:
+            for connection in self.connections:
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            return self.store.close(timeout)
+
+    def disconnected(self, connection):
+        with self._lock:
+            self.connections.discard(connection)
+
+    def handle(self, connection, method, params):
+        handler = getattr(self, 'do_' + method, None)
+        if handler is None:
+            raise ValueError(f'Unknown method: {method}')
+        with self._lock:
+            self.store.undo_stack = connection.undo_stack
+            result, days = handler(*params)
+            if days != []:
+                self.notify(connection, days)
+        return result
+
+    def notify(self, sender, days):
+        message = {'event': 'changed', 'dates': days}
+        for connection in self.connections:
+            if connection is not sender:
+                try:
+                    connection.send(message)
+                except OSError:
+                    pass
+
+    def _indices(self, date, task_ids):
+        # positions of tasks in day, in order of task_ids
+        positions = {task.id: idx for idx, task in enumerate(self.store.tasks(date))}
+        return [positions[task_id] for task_id in task_ids]
+
+    def _occurrence(self, rule_id, day):
+        for occurrence in self.store.occurrences(date_type.fromisoformat(day)):
+            if occurrence.rule_id == rule_id:
+                return occurrence
+        raise KeyError(f'No occurrence of rule {rule_id} on {day}')
+
+    def do_tasks(self, day):
+        return [task.to_record() for task in self.store.tasks(locale_date(day))], []
+
+    def do_add(self, day, text, done=False):
+        return self.store.add(locale_date(day), text, done).to_record(), [day]
+
+    def do_edit(self, day, task_id, text):
+        date = locale_date(day)
+        return self.store.edit(date, self._indices(date, [task_id])[0], text).to_record(), [day]
+
+    def do_set_done(self, day, task_ids, done):
+        date = locale_date(day)
+        indices = self._indices(date, task_ids)
+        self.store.set_done_many(date, indices, done)
+        tasks = self.store.tasks(date)
+        return [tasks[idx].to_record() for idx in indices], [day]
+
+    def do_delete(self, day, task_ids):
+        date = locale_date(day)
+        tasks = self.store.delete_many(date, self._indices(date, task_ids))
+        return [task.id for task in tasks], [day]
+
+    def do_move(self, day, task_ids, to_day):
+        date = locale_date(day)
+        tasks = self.store.move_many(date, self._indices(date, task_ids), locale_date(to_day))
+        return [task.id for task in tasks], [day, to_day]
+
+    def do_undo(self):
+        days = sorted(iso_date(date) for date in self.store.undo())
+        return days, days
+
+    def do_days(self, start, end):
+        # tasks of days from start to end; days without tasks are left out
+        days = self.store.iter_days(date_type.fromisoformat(start), date_type.fromisoformat(end))
+        return {day.isoformat(): [task.to_record() for task in tasks] for day, tasks in days if tasks}, []
+
+    def do_search(self, query):
+        results = []
+        for chunk in self.store.search_index.search(query):
+            results.extend(chunk)
+            if len(results) >= self.search_limit:
+                break
+        return results[:self.search_limit], []
+
+    def do_month_summary(self, month):
+        # {'YYYY-MM-DD': [total, done]} of days of month which have tasks
+        return self.store.day_summary.months.get(month, {}), []
+
+    def do_prefetch(self, months):
+        self.store.month_cache.prefetch(months)
+        return None, []
+
+    def do_rebuild_indexes(self, names):
+        self.store.rebuild_indexes([getattr(self.store, name) for name in names] or None)
+        return None, []
+
+    def do_archive_old_months(self, age):
+        return self.store.archive_old_months(age), []
+
+    def do_flush(self):
+        self.store.flush()
+        return None, []
+
+    def do_occurrences(self, day):
+        rules = self.store.recurring.rules
+        return [
+            (rules[occurrence.rule_id].to_record(), occurrence.done, occurrence.text, occurrence.updated)
+            for occurrence in self.store.occurrences(date_type.fromisoformat(day))
+        ], []
+
+    def do_add_rule(self, text, kind, start, interval=1):
+        return self.store.add_rule(text, kind, date_type.fromisoformat(start), interval).to_record(), None
+
+    def do_end_rule(self, rule_id, last_day):
+        self.store.end_rule(rule_id, date_type.fromisoformat(last_day))
+        return None, None
+
+    def do_set_occurrence_done(self, rule_id, day, done):
+        self.store.set_occurrence_done(self._occurrence(rule_id, day), done)
+        return None, [day]
+
+    def do_edit_occurrence(self, rule_id, day, text):
+        self.store.edit_occurrence(self._occurrence(rule_id, day), text)
+        return None, [day]
+
+    def do_skip_occurrence(self, rule_id, day):
+        self.store.skip_occurrence(self._occurrence(rule_id, day))
+        return None, [day]
+
+
+class RemoteStore:
+    """Tasks served by `TaskServer`, with the methods of `TaskStore` used by the app.
+
+    Days are kept as lists of `Task` (last `day_cache_size` days), so
+    showing a day again needs no request. Days changed by other clients
+    are fetched again on next `tasks` call; `pop_changed` tells if a day
+    was changed since it was last checked. Index arguments refer to the
+    kept list of the day, i.e. to tasks shown by the app. Day summary is
+    requested for whole month (one request per calendar redraw) and kept
+    until any change is made.
+    """
+
+    day_cache_size = 62
+    # requests which do not change tasks, so kept day summary stays valid
+    read_methods = frozenset(('tasks', 'days', 'search', 'month_summary', 'occurrences', 'prefetch', 'flush'))
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._replies = {}
+        self._closed = False
+        self._days = {}
+        self._stale = set()
+        self._changed = set()
+        self._changed_all = False
+        self._summary = {}
+        # attributes used by the app in place of TaskStore ones
+        self.search_index = SimpleNamespace(name='search_index', search=self.search)
+        self.day_summary = SimpleNamespace(name='day_summary', get=self.day_summary_get)
+        self.month_cache = SimpleNamespace(prefetch=lambda months: self.call('prefetch', list(months)))
+        self.writer = SimpleNamespace(errors=queue.Queue())
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def connect(cls, data_path):
+        """Connect to server of data_path; return None if server is not running"""
+        path = socket_file_path(data_path)
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except OSError:
+            return None
+
+    def call(self, method, *params):
+        """Send request and wait for its result"""
+        with self._lock:
+            if self._closed:
+                raise ConnectionError('Connection to task server is closed')
+            if method not in self.read_methods:
+                self._summary = {}
+            self._next_id += 1
+            request_id = self._next_id
+            reply = self._replies[request_id] = [threading.Event(), None]
+            self.sock.sendall(encode({'id': request_id, 'method': method, 'params': params}))
+        reply[0].wait()
+        message = reply[1]
+        if 'error' in message:
+            raise RuntimeError(message['error'])
+        return message['result']
+
+    def _read(self):
+        try:
+            for line in self.sock.makefile('rb'):
+                message = json.loads(line)
+                if 'event' in message:
+                    self._days_changed(message['dates'])
+                    continue
+                with self._lock:
+                    reply = self._replies.pop(message['id'])
+                reply[1] = message
+                reply[0].set()
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            closing = self._closed
+            self._closed = True
+            replies, self._replies = self._replies, {}
+        for reply in replies.values():
+            reply[1] = {'error': 'Connection to task server is closed'}
+            reply[0].set()
+        if not closing:
+            self.writer.errors.put(('task server', 'connection closed, changes are not saved'))
+
+    def _days_changed(self, days):
+        with self._lock:
+            self._summary = {}
+            if days is None:
+                self._stale.update(self._days)
+                self._changed_all = True
+            else:
+                dates = [locale_date(day) for day in days]
+                self._stale.update(dates)
+                self._changed.update(dates)
+
+    def pop_changed(self, date):
+        """Check if date was changed by other clients since last check"""
+        with self._lock:
+            changed = self._changed_all or date_key(date) in self._changed
+            self._changed.clear()
+            self._changed_all = False
+        return changed
+
+    def tasks(self, date, pin=False):
+        date = date_key(date)
+        with self._lock:
+            tasks = None if date in self._stale else self._days.get(date)
+        if tasks is None:
+            tasks = [Task.from_record(record) for record in self.call('tasks', iso_date(date))]
+            with self._lock:
+                self._stale.discard(date)
+                self._days.pop(date, None)
+                self._days[date] = tasks
+                while len(self._days) > self.day_cache_size:
+                    del self._days[next(iter(self._days))]
+        return tasks
+
+    def _day(self, date):
+        # kept tasks of day, even if changed by other client since
+        with self._lock:
+            tasks = self._days.get(date)
+        return tasks if tasks is not None else self.tasks(date)
+
+    def add(self, date, text, done=False):
+        date = date_key(date)
+        tasks = self._day(date)
+        task = Task.from_record(self.call('add', iso_date(date), text, done))
+        tasks.append(task)
+        return task
+
+    def edit(self, date, idx, text):
+        date = date_key(date)
+        task = self._day(date)[idx]
+        update_task(task, self.call('edit', iso_date(date), task.id, text))
+        return task
+
+    def set_done_many(self, date, indices, done):
+        date = date_key(date)
+        tasks = self._day(date)
+        records = self.call('set_done', iso_date(date), [tasks[idx].id for idx in indices], done)
+        for idx, record in zip(indices, records):
+            update_task(tasks[idx], record)
+        return [tasks[idx] for idx in indices]
+
+    def _remove(self, date, indices):
+        # remove tasks at indices from kept day; return them in original order
+        tasks = self._day(date)
+        removed = [tasks[idx] for idx in sorted(indices)]
+        for idx in sorted(indices, reverse=True):
+            del tasks[idx]
+        return removed
+
+    def delete_many(self, date, indices):
+        date = date_key(date)
+        tasks = self._day(date)
+        self.call('delete', iso_date(date), [tasks[idx].id for idx in indices])
+        return self._remove(date, indices)
+
+    def move_many(self, date, indices, to_date):
+        date, to_date = date_key(date), date_key(to_date)
+        if date == to_date:
+            return []
+        tasks = self._day(date)
+        self.call('move', iso_date(date), [tasks[idx].id for idx in indices], iso_date(to_date))
+        with self._lock:
+            self._stale.add(to_date)
+        return self._remove(date, indices)
+
+    def undo(self):
+        dates = {locale_date(day) for day in self.call('undo')}
+        with self._lock:
+            self._stale.update(dates)
+        return dates
+
+    def iter_days(self, start, end, workers=4):
+        """Yield (day, tasks) for every day from start to end, requesting one month at a time"""
+        for month, days in days_by_month(start, end):
+            records = self.call('days', days[0].isoformat(), days[-1].isoformat())
+            for day in days:
+                yield day, [Task.from_record(record) for record in records.get(day.isoformat(), ())]
+
+    def search(self, query, chunk_size=200):
+        results = [tuple(result) for result in self.call('search', query)]
+        for start in range(0, len(results), chunk_size):
+            yield results[start:start + chunk_size]
+
+    def day_summary_get(self, day):
+        month = f'{day[:4]}_{day[5:7]}'
+        with self._lock:
+            summary = self._summary
+            counts = summary.get(month)
+        if counts is None:
+            counts = self.call('month_summary', month)
+            with self._lock:
+                # not kept if summary was dropped by change made meanwhile
+                summary[month] = counts
+        return tuple(counts.get(day, (0, 0)))
+
+    def occurrences(self, date):
+        day = parse_day(date)
+        return [
+            Occurrence(Rule.from_record(rule), day, done, text, updated)
+            for rule, done, text, updated in self.call('occurrences', day.isoformat())
+        ]
+
+    def add_rule(self, text, kind, start, interval=1):
+        return Rule.from_record(self.call('add_rule', text, kind, parse_day(start).isoformat(), interval))
+
+    def end_rule(self, rule_id, last_date):
+        self.call('end_rule', rule_id, parse_day(last_date).isoformat())
+
+    def set_occurrence_done(self, occurrence, done):
+        self.call('set_occurrence_done', occurrence.rule_id, occurrence.day.isoformat(), done)
+        occurrence.set_done(done)
+
+    def edit_occurrence(self, occurrence, text):
+        self.call('edit_occurrence', occurrence.rule_id, occurrence.day.isoformat(), text)
+        occurrence.set_text(text)
+
+    def skip_occurrence(self, occurrence):
+        self.call('skip_occurrence', occurrence.rule_id, occurrence.day.isoformat())
+
+    def load_indexes(self):
+        # indexes are loaded (and missing ones rebuilt) by server
+        return []
+
+    def rebuild_indexes(self, indexes=None, flush=True):
+        self.call('rebuild_indexes', [index.name for index in indexes or ()])
+
+    def archive_old_months(self, age):
+        return self.call('archive_old_months', age)
+
+    def flush(self, wait=True):
+        # server writes changes in background; with wait, wait until they are written
+        if wait:
+            self.call('flush')
+
+    def close(self, timeout=None, save_indexes=True):
+        """Close connection; changes are already sent to server"""
+        with self._lock:
+            self._closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        return True
@@ -0,0 +1,25 @@
+import sys
+import time
+
+
+# time of first import, as close to process start as app code gets
+start_time = time.perf_counter()
+enabled = False
+marks = []
+
+
+def mark(name):
+    """Remember time of startup step when profiling is enabled"""
+    if enabled:
+        marks.append((name, time.perf_counter()))
+
+
+def report(file=None):
+    """Print time of each startup step and time since start"""
+    file = file or sys.stderr
+    print('Startup profile (ms):', file=file)
+    print(f'{"step":<32}{"step time":>12}{"since start":>14}', file=file)
+    previous = start_time
+    for name, mark_time in marks:
+        print(f'{name:<32}{(mark_time - previous) * 1000:>12.1f}{(mark_time - start_time) * 1000:>14.1f}', file=file)
+        previous = mark_time
@@ -0,0 +1,661 @@
+import lzma
+import os
+import os.path
+import pickle
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from .model import CHECK_MARK, Task, is_legacy_month, tasks_from_records, tasks_to_records
+
+
+def parse_date(date):
+    """Parse task date in locale '%x' format, falling back to 'YYYY-MM-DD'
+
+    Month files store dates formatted with locale of the app that wrote
+    them, so files created with different locale are still readable.
+    """
+    try:
+        return datetime.strptime(date, r'%x')
+    except ValueError:
+        return datetime.strptime(date, '%Y-%m-%d')
+
+
+def month_of(date):
+    """Return 'YYYY_MM' month key for a task date in locale '%x' format"""
+    return parse_date(date).strftime('%Y_%m')
+
+
+def month_file_path(directory, month):
+    return os.path.join(directory, f'task_data_{month}.dat')
+
+
+def journal_file_path(directory, month):
+    return os.path.join(directory, f'task_data_{month}.journal')
+
+
+def archive_file_path(directory):
+    return os.path.join(directory, 'task_archive.dat')
+
+
+def write_file_atomic(path, data: bytes):
+    """Write data to temporary file, flush it to disk and rename it over path"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def apply_record(data_dict, record):
+    """Apply single journal record to stored month dictionary {date: [task record, ...]}
+
+    Journal records are ('add', date, task_record), ('insert', date, idx,
+    task_record), ('edit', date, idx, task_record), ('toggle', date, idx,
+    task_record) and ('delete', date, idx), where task_record is
+    `Task.to_record()` tuple.
+    """
+    operation, date, *args = record
+    items = data_dict.setdefault(date, [])
+    if operation == 'add':
+        task_record, = args
+        items.append(task_record)
+    elif operation == 'insert':
+        idx, task_record = args
+        items.insert(idx, task_record)
+    elif operation in ('edit', 'toggle'):
+        idx, task_record = args
+        items[idx] = task_record
+    elif operation == 'delete':
+        idx, = args
+        del items[idx]
+    else:
+        raise ValueError(f'Unknown journal operation: {operation}')
+    if not items:
+        del data_dict[date]
+
+
+class MonthJournal:
+    """Append-only journal on top of month snapshot file.
+
+    Every task change is appended to 'task_data_YYYY_MM.journal' as one small
+    pickled record and flushed to disk, so a crash loses at most the record
+    being written. The journal starts with a header holding checksum of the
+    snapshot it was written against; after compaction the snapshot changes
+    and a left over journal is recognised as stale instead of being replayed
+    twice.
+    """
+
+    # journal size (bytes) after which month is compacted in background
+    compact_threshold = 64 * 1024
+
+    def __init__(self, directory, month):
+        self.directory = directory
+        self.month = month
+        self.snapshot_path = month_file_path(directory, month)
+        self.journal_path = journal_file_path(directory, month)
+        self._lock = threading.Lock()
+        self._compaction_thread = None
+        # journal header checked against snapshot (done once per compaction)
+        self._journal_ready = False
+
+    def _read_snapshot(self):
+        if os.path.isfile(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                raw = f.read()
+            return pickle.loads(raw), zlib.crc32(raw)
+        return {}, None
+
+    def _replay(self, data_dict, checksum):
+        if not os.path.isfile(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            try:
+                header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                return
+            if header != ('base', checksum):
+                # journal already merged into snapshot
+                return
+            valid_size = f.tell()
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    if f.tell() == valid_size:
+                        return
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError, IndexError):
+                    break
+                try:
+                    apply_record(data_dict, record)
+                except (TypeError, ValueError, IndexError, KeyError):
+                    # record written against other version of month (e.g. by
+                    # another app window); it and the rest are dropped
+                    break
+                valid_size = f.tell()
+        # drop last record truncated by crash, so new records follow valid ones
+        os.truncate(self.journal_path, valid_size)
+
+    def _load(self):
+        data_dict, checksum = self._read_snapshot()
+        self._replay(data_dict, checksum)
+        return data_dict, checksum
+
+    def load(self):
+        with self._lock:
+            return self._load()[0]
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append records to journal with one write and fsync"""
+        with self._lock:
+            if not os.path.exists(self.directory):
+                os.mkdir(self.directory)
+            new_journal = not self._journal_ready and not self._journal_valid()
+            with open(self.journal_path, 'wb' if new_journal else 'ab') as f:
+                if new_journal:
+                    pickle.dump(('base', self._snapshot_checksum()), f)
+                self._journal_ready = True
+                f.write(b''.join(pickle.dumps(record) for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        if size > self.compact_threshold:
+            self.compact_in_background()
+
+    def _snapshot_checksum(self):
+        if os.path.isfile(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                return zlib.crc32(f.read())
+        return None
+
+    def _journal_valid(self):
+        if not os.path.isfile(self.journal_path):
+            return False
+        try:
+            with open(self.journal_path, 'rb') as f:
+                header = pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):
+            return False
+        return header == ('base', self._snapshot_checksum())
+
+    def _write_snapshot(self, data_dict):
+        if data_dict:
+            if not os.path.exists(self.directory):
+                os.mkdir(self.directory)
+            write_file_atomic(self.snapshot_path, pickle.dumps(data_dict))
+        elif os.path.isfile(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_ready = False
+
+    def compact(self):
+        """Merge journal into month snapshot and remove journal file"""
+        with self._lock:
+            if not os.path.isfile(self.journal_path):
+                return
+            self._write_snapshot(self._load()[0])
+
+    def replace(self, data_dict):
+        """Write whole month as new snapshot and drop journal"""
+        with self._lock:
+            self._write_snapshot(data_dict)
+
+    def remove(self):
+        """Remove month snapshot and journal files"""
+        with self._lock:
+            for path in (self.snapshot_path, self.journal_path):
+                if os.path.isfile(path):
+                    os.remove(path)
+            self._journal_ready = False
+
+    def compact_in_background(self):
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compaction_thread.start()
+
+    def wait_for_compaction(self):
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+
+
+ARCHIVE_MAGIC = b'TODOARC1'
+
+codecs = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+
+
+class MonthArchive:
+    """Old months compressed in single file.
+
+    File is magic header, compressed pickled month dictionaries one after
+    another, pickled index {month: (offset, length, codec)} and footer with
+    index offset and magic. One month is read by seeking to its offset, so
+    nothing else has to be decompressed. Archive is rewritten (atomically)
+    only when months are added.
+    """
+
+    compression = 'lzma'
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._read_index()
+            return self._index
+
+    def _read_index(self):
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path, 'rb') as f:
+            end = f.seek(-(8 + len(ARCHIVE_MAGIC)), os.SEEK_END)
+            footer = f.read()
+            if footer[8:] != ARCHIVE_MAGIC:
+                raise ValueError(f'{self.path} is not a task archive')
+            offset = int.from_bytes(footer[:8], 'little')
+            f.seek(offset)
+            return pickle.loads(f.read(end - offset))
+
+    def months(self):
+        return sorted(self.index)
+
+    def __contains__(self, month):
+        return month in self.index
+
+    def _read_blob(self, month):
+        offset, length, codec = self.index[month]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length), codec
+
+    def load(self, month):
+        """Return stored month dictionary {date: [task record, ...]} of archived month"""
+        blob, codec = self._read_blob(month)
+        return pickle.loads(codecs[codec][1](blob))
+
+    def update(self, months):
+        """Add (or replace) months given as {month: {date: [task record, ...]}}"""
+        compress = codecs[self.compression][0]
+        blobs = {}
+        for month in self.index:
+            if month not in months:
+                blobs[month] = self._read_blob(month)
+        for month, data_dict in months.items():
+            blobs[month] = (compress(pickle.dumps(data_dict, pickle.HIGHEST_PROTOCOL)), self.compression)
+        parts = [ARCHIVE_MAGIC]
+        offset = len(ARCHIVE_MAGIC)
+        index = {}
+        for month in sorted(blobs):
+            blob, codec = blobs[month]
+            index[month] = (offset, len(blob), codec)
+            parts.append(blob)
+            offset += len(blob)
+        parts.append(pickle.dumps(index, pickle.HIGHEST_PROTOCOL))
+        parts.append(offset.to_bytes(8, 'little') + ARCHIVE_MAGIC)
+        write_file_atomic(self.path, b''.join(parts))
+        with self._lock:
+            self._index = index
+
+
+class StorageBackend:
+    """Base class for task storage.
+
+    Backend stores month dictionaries {date: [Task, ...]} keyed by
+    'YYYY_MM' month. Backends with `records_changes` persist every change
+    passed to `record` and do not need whole month to be saved. Backends
+    with `indexed` can load single day without reading whole month.
+    """
+
+    records_changes = False
+    indexed = False
+
+    def load_month(self, month):
+        raise NotImplementedError
+
+    def save_month(self, month, data_dict):
+        raise NotImplementedError
+
+    def load_day(self, date):
+        return self.load_month(month_of(date)).get(date, [])
+
+    def record(self, month, record):
+        pass
+
+    def archive_months(self, before):
+        """Move months before 'YYYY_MM' month into cold archive; return archived months"""
+        return []
+
+    def record_many(self, month, records):
+        """Persist several changes of month together"""
+        for record in records:
+            self.record(month, record)
+
+    def months(self):
+        """Return sorted list of stored months"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PickleBackend(StorageBackend):
+    """One pickle file per month, optionally with append-only journal.
+
+    Months moved to cold archive (`archive_months`) are read from
+    'task_archive.dat'. A month file (hot tier) always takes precedence over
+    archived copy of the month; archived month is written back to month file
+    before it is changed. Months with files are listed once and then
+    tracked, so loading a month does not probe the directory.
+    """
+
+    def __init__(self, directory, journal=True):
+        self.directory = directory
+        self.journal = journal
+        self.records_changes = journal
+        self.archive = MonthArchive(archive_file_path(directory))
+        self._journals = {}
+        self._hot_months = None
+        self._lock = threading.Lock()
+        # held while months are archived, so no change is written meanwhile
+        self._archive_lock = threading.RLock()
+
+    def _month_journal(self, month):
+        with self._lock:
+            if month not in self._journals:
+                self._journals[month] = MonthJournal(self.directory, month)
+            return self._journals[month]
+
+    def _hot(self):
+        # set of months with month file or journal
+        with self._lock:
+            if self._hot_months is None:
+                self._hot_months = set(self._scan_months())
+            return self._hot_months
+
+    def _scan_months(self):
+        if not os.path.isdir(self.directory):
+            return []
+        months = set()
+        for name in os.listdir(self.directory):
+            if name.startswith('task_data_') and name.endswith(('.dat', '.journal')):
+                months.add(name[len('task_data_'):].rsplit('.', 1)[0])
+        return months
+
+    def _set_hot(self, month, hot=True):
+        hot_months = self._hot()
+        with self._lock:
+            if hot:
+                hot_months.add(month)
+            else:
+                hot_months.discard(month)
+
+    def _archived(self, month):
+        return month not in self._hot() and month in self.archive
+
+    def _load_records(self, month):
+        if self._archived(month):
+            return self.archive.load(month)
+        if month not in self._hot():
+            return {}
+        if self.journal:
+            return self._month_journal(month).load()
+        file = month_file_path(self.directory, month)
+        if os.path.isfile(file):
+            with open(file, 'rb') as f:
+                return pickle.load(f)
+        return {}
+
+    def load_month(self, month):
+        records = self._load_records(month)
+        data_dict = tasks_from_records(records)
+        if is_legacy_month(records):
+            # store upgraded month at once, so task ids stay stable
+            self.save_month(month, data_dict)
+        return data_dict
+
+    def save_month(self, month, data_dict):
+        with self._archive_lock:
+            self._save_records(month, tasks_to_records(data_dict))
+
+    def _save_records(self, month, data_dict):
+        file = month_file_path(self.directory, month)
+        if self.journal:
+            self._month_journal(month).replace(data_dict)
+        elif len(data_dict) > 0:
+            if not os.path.exists(self.directory):
+                os.mkdir(self.directory)
+            write_file_atomic(file, pickle.dumps(data_dict))
+        elif os.path.isfile(file):
+            os.remove(file)
+        if not data_dict and month in self.archive:
+            # empty month file hides archived copy of month
+            write_file_atomic(file, pickle.dumps(data_dict))
+        self._set_hot(month, bool(data_dict) or month in self.archive)
+
+    def _promote(self, month):
+        # archived month is copied to month file before it is changed
+        if self._archived(month):
+            self._save_records(month, self.archive.load(month))
+
+    def record(self, month, record):
+        self.record_many(month, [record])
+
+    def record_many(self, month, records):
+        if self.journal:
+            with self._archive_lock:
+                self._promote(month)
+                self._month_journal(month).append_many(records)
+                self._set_hot(month)
+
+    def months(self):
+        return sorted(self._hot().union(self.archive.index))
+
+    def archive_months(self, before):
+        with self._archive_lock:
+            months = sorted(month for month in self._hot() if month < before)
+            if not months:
+                return []
+            # records are upgraded, so archived months never have to be saved on load
+            self.archive.update({
+                month: tasks_to_records(tasks_from_records(self._load_records(month))) for month in months
+            })
+            for month in months:
+                if self.journal:
+                    month_journal = self._month_journal(month)
+                    month_journal.wait_for_compaction()
+                    month_journal.remove()
+                else:
+                    os.remove(month_file_path(self.directory, month))
+                self._set_hot(month, False)
+            return months
+
+    def close(self):
+        for month_journal in self._journals.values():
+            month_journal.wait_for_compaction()
+
+
+def iso_date(date):
+    """Convert locale '%x' date to canonical 'YYYY-MM-DD' date"""
+    return parse_date(date).strftime('%Y-%m-%d')
+
+
+def locale_date(day):
+    """Convert canonical 'YYYY-MM-DD' date to locale '%x' date"""
+    return datetime.strptime(day, '%Y-%m-%d').strftime(r'%x')
+
+
+class SQLiteBackend(StorageBackend):
+    """All tasks in single SQLite database (WAL mode) indexed by canonical date"""
+
+    records_changes = True
+    indexed = True
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.mkdir(directory)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS tasks ('
+                'day TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, done INTEGER NOT NULL, '
+                'id INTEGER, created REAL NOT NULL DEFAULT 0, updated REAL NOT NULL DEFAULT 0)'
+            )
+            self._upgrade_schema()
+            self.connection.execute('CREATE INDEX IF NOT EXISTS tasks_day ON tasks (day, position)')
+
+    def _upgrade_schema(self):
+        # databases created before tasks had ids keep check mark in text
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(tasks)')]
+        if 'id' not in columns:
+            self.connection.execute('ALTER TABLE tasks ADD COLUMN id INTEGER')
+            self.connection.execute('ALTER TABLE tasks ADD COLUMN created REAL NOT NULL DEFAULT 0')
+            self.connection.execute('ALTER TABLE tasks ADD COLUMN updated REAL NOT NULL DEFAULT 0')
+            self.connection.execute('UPDATE tasks SET id = rowid')
+            self.connection.execute(
+                'UPDATE tasks SET text = substr(text, ?) WHERE done AND substr(text, 1, ?) = ?',
+                (len(CHECK_MARK) + 1, len(CHECK_MARK), CHECK_MARK)
+            )
+
+    @staticmethod
+    def _month_range(month):
+        year, month_number = month.split('_')
+        return f'{year}-{month_number}-01', f'{year}-{month_number}-31'
+
+    def load_month(self, month):
+        data_dict = {}
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT day, id, text, done, created, updated FROM tasks '
+                'WHERE day BETWEEN ? AND ? ORDER BY day, position',
+                self._month_range(month)
+            ).fetchall()
+        for day, task_id, text, done, created, updated in rows:
+            data_dict.setdefault(locale_date(day), []).append(Task(text, bool(done), created, updated, task_id))
+        return data_dict
+
+    def load_day(self, date):
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT id, text, done, created, updated FROM tasks WHERE day = ? ORDER BY position',
+                (iso_date(date),)
+            ).fetchall()
+        return [Task(text, bool(done), created, updated, task_id) for task_id, text, done, created, updated in rows]
+
+    def save_month(self, month, data_dict):
+        with self._lock, self.connection:
+            self.connection.execute('DELETE FROM tasks WHERE day BETWEEN ? AND ?', self._month_range(month))
+            self._insert_month(data_dict)
+
+    def _insert_month(self, data_dict):
+        self.connection.executemany(
+            'INSERT INTO tasks (day, position, text, done, id, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                (iso_date(date), position, task.text, task.done, task.id, task.created, task.updated)
+                for date, tasks in data_dict.items()
+                for position, task in enumerate(tasks)
+            )
+        )
+
+    def record(self, month, record):
+        self.record_many(month, [record])
+
+    def record_many(self, month, records):
+        """Apply records in one transaction"""
+        with self._lock, self.connection:
+            for record in records:
+                self._apply_record(record)
+
+    def _apply_record(self, record):
+        operation, date, *args = record
+        day = iso_date(date)
+        if operation == 'add':
+            (task_id, text, done, created, updated), = args
+            self.connection.execute(
+                'INSERT INTO tasks (day, position, text, done, id, created, updated) '
+                'SELECT ?, COUNT(*), ?, ?, ?, ?, ? FROM tasks WHERE day = ?',
+                (day, text, done, task_id, created, updated, day)
+            )
+        elif operation == 'insert':
+            idx, (task_id, text, done, created, updated) = args
+            self.connection.execute(
+                'UPDATE tasks SET position = position + 1 WHERE day = ? AND position >= ?', (day, idx)
+            )
+            self.connection.execute(
+                'INSERT INTO tasks (day, position, text, done, id, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (day, idx, text, done, task_id, created, updated)
+            )
+        elif operation in ('edit', 'toggle'):
+            idx, (task_id, text, done, created, updated) = args
+            self.connection.execute(
+                'UPDATE tasks SET text = ?, done = ?, id = ?, created = ?, updated = ? '
+                'WHERE day = ? AND position = ?',
+                (text, done, task_id, created, updated, day, idx)
+            )
+        elif operation == 'delete':
+            idx, = args
+            self.connection.execute('DELETE FROM tasks WHERE day = ? AND position = ?', (day, idx))
+            self.connection.execute(
+                'UPDATE tasks SET position = position - 1 WHERE day = ? AND position > ?', (day, idx)
+            )
+        else:
+            raise ValueError(f'Unknown journal operation: {operation}')
+
+    def months(self):
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT substr(day, 1, 4) || '_' || substr(day, 6, 2) FROM tasks ORDER BY 1"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def create_backend(kind, directory):
+    """Create storage backend by name: 'journal', 'pickle' or 'sqlite'"""
+    if kind == 'journal':
+        return PickleBackend(directory, journal=True)
+    if kind == 'pickle':
+        return PickleBackend(directory, journal=False)
+    if kind == 'sqlite':
+        return SQLiteBackend(os.path.join(directory, 'tasks.sqlite3'))
+    raise ValueError(f'Unknown storage backend: {kind}')
+
+
+def migrate_to_sqlite(directory, database_path=None):
+    """Import all month files from directory into SQLite database.
+
+    Months already present in database are replaced. Returns number of
+    imported tasks.
+    """
+    source = PickleBackend(directory, journal=True)
+    target = SQLiteBackend(database_path or os.path.join(directory, 'tasks.sqlite3'))
+    count = 0
+    with target._lock, target.connection:
+        for month in source.months():
+            # month files are only read, old records are upgraded in database
+            data_dict = tasks_from_records(source._load_records(month))
+            target.connection.execute('DELETE FROM tasks WHERE day BETWEEN ? AND ?', target._month_range(month))
+            target._insert_month(data_dict)
+            count += sum(len(items) for items in data_dict.values())
+    target.close()
+    return count
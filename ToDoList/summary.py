@@ -0,0 +1,91 @@
+import os.path
+import pickle
+import threading
+
+from .storage import iso_date, write_file_atomic
+
+
+def summary_file_path(directory):
+    return os.path.join(directory, 'day_summary.dat')
+
+
+class DaySummary:
+    """Number of all and completed tasks for every day with tasks.
+
+    Counts are kept as {'YYYY_MM': {'YYYY-MM-DD': [total, done]}}, so
+    calendar can show state of any month without loading its tasks. Counts
+    are updated with `task_changed` for every task change and saved to
+    single pickle file; `rebuild` counts them again from storage backend.
+    """
+
+    version = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        self.months = {}
+        self.changed = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Load summary from file; return None if file is missing or unreadable"""
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if data.get('version') != cls.version:
+            return None
+        summary = cls(path)
+        summary.months = data['months']
+        return summary
+
+    def dumps(self):
+        with self._lock:
+            return pickle.dumps({'version': self.version, 'months': self.months})
+
+    def save(self):
+        write_file_atomic(self.path, self.dumps())
+        self.changed = False
+
+    def get(self, day):
+        """Return (total, done) for canonical 'YYYY-MM-DD' day"""
+        counts = self.months.get(f'{day[:4]}_{day[5:7]}', {}).get(day)
+        return tuple(counts) if counts else (0, 0)
+
+    def _add(self, day, total, done):
+        month = self.months.setdefault(f'{day[:4]}_{day[5:7]}', {})
+        counts = month.setdefault(day, [0, 0])
+        counts[0] += total
+        counts[1] += done
+        if counts[0] <= 0:
+            del month[day]
+            if not month:
+                del self.months[f'{day[:4]}_{day[5:7]}']
+        self.changed = True
+
+    def task_changed(self, date, operation, task):
+        """Update counts after 'add', 'insert', 'edit', 'toggle' or 'delete' of task on date ('%x' format)"""
+        with self._lock:
+            if operation in ('add', 'insert'):
+                self._add(iso_date(date), 1, int(task.done))
+            elif operation == 'delete':
+                self._add(iso_date(date), -1, -int(task.done))
+            elif operation == 'toggle':
+                self._add(iso_date(date), 0, 1 if task.done else -1)
+
+    def rebuild(self, storage):
+        """Count tasks of all months stored in storage backend"""
+        months = {}
+        for month in storage.months():
+            counts = {}
+            for date, tasks in storage.load_month(month).items():
+                if tasks:
+                    counts[iso_date(date)] = [len(tasks), sum(task.done for task in tasks)]
+            if counts:
+                months[month] = counts
+        with self._lock:
+            self.months = months
+            self.changed = True
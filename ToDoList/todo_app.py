@@ -1,11 +1,21 @@
 import os
 import os.path
-import pickle
+import threading
 import tkinter as tk
 import ttkbootstrap as ttk
-from custom_widgets import CustomDateEntry
+from .custom_widgets import CustomDateEntry, RangeWindow, SearchWindow, StatsWindow, VirtualListbox
+from .custom_dialogs import CustomQuerybox
+from .storage import locale_date
+from .cache import adjacent_months
+from .core import TaskStore
+from .server import RemoteStore
+from .day_view import DayView, SORT_MODES, STATUS_FILTERS
+from .model import Task
+from .recurring import Occurrence, RULE_KINDS
+from . import startup_profile
+from . import instrument
 from tkinter.font import Font
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 
 class ToDoApp(ttk.Window):
@@ -13,10 +23,36 @@ class ToDoApp(ttk.Window):
     main_path = os.path.dirname(app_file_path)
     icon_path = os.path.join(main_path, 'data', 'blank_icon.png')
     theme_path = os.path.join(main_path, 'data', 'app_theme.json')
-
-    def __init__(self):
+    data_path = os.path.join(main_path, 'data', 'app_data')
+    # storage backend: 'journal', 'pickle' or 'sqlite'
+    storage_kind = 'journal'
+    # number of months kept in memory
+    month_cache_size = 6
+    # months older than this (in months) are moved to compressed archive on start (None: never)
+    archive_after_months = 12
+    # use tasks of task server (python -m ToDoList serve) when it is running
+    use_server = True
+    # interval (ms) of checking changes made by other task server clients
+    server_check_interval = 200
+    # max time (seconds) app window waits for pending writes on exit
+    exit_flush_timeout = 2.0
+    # task list row colours
+    completed_task_style = {'fg': '#efefef', 'selectforeground': '#252525', 'selectbackground': '#95a5a6'}
+    pending_task_style = {'fg': '#212529', 'selectbackground': '#95a5a6'}
+    # methods timed when instrumentation is enabled
+    instrumented_handlers = (
+        'add_new_task',
+        'delete_task',
+        'edit_task',
+        'task_completion_button_action',
+        'load_task_for_date',
+        'exit_by_x',
+    )
+    instrumented_storage_calls = ('load_month', 'save_month', 'load_day', 'record', 'record_many')
+
+    def __init__(self, storage_kind=None, month_cache_size=None):
         super().__init__()
-        self.geometry('600x530')
+        self.geometry('600x575')
         self.title('TO-DO LIST')
         self.resizable(False, False)
         if os.path.isfile(ToDoApp.icon_path):
@@ -35,36 +71,129 @@ class ToDoApp(ttk.Window):
             self.app_style.theme_use(themename='flatly')
             self.theme_file_check = False
         self.app_style.configure(style='TButton', font=self.main_font)
+        startup_profile.mark('theme loaded')
 
-        # set tasks variables
-        self.data_dict_var = {}
+        # set tasks variables (search index and per-day task counts shown in
+        # calendar are empty until loaded together with tasks)
         self.data_dict_items_list = []
-        self.data_task_list = []
+        self.occurrence_list = []
+        self.task_view = DayView(self.data_dict_items_list)
         self.task_index = None
+        self.store = RemoteStore.connect(ToDoApp.data_path) if ToDoApp.use_server else None
+        if self.store is None:
+            self.store = TaskStore(
+                ToDoApp.data_path,
+                storage_kind=storage_kind or ToDoApp.storage_kind,
+                month_cache_size=month_cache_size or ToDoApp.month_cache_size,
+                background=True
+            )
+        self.search_window = None
+        self.range_window = None
+        self.index_rebuild_thread = None
+        self.data_load_thread = None
+        self.missing_indexes = []
+        self.stats_window = None
+
+        # wrap action handlers before they are bound to widgets
+        instrument.wrap_methods(self, ToDoApp.instrumented_handlers, 'ui')
+        if isinstance(self.store, RemoteStore):
+            instrument.wrap_methods(self.store, ('call',), 'server')
+        else:
+            instrument.wrap_methods(self.store.storage, ToDoApp.instrumented_storage_calls, 'storage')
 
-        # set task entry variable
+        # set task entry and filter variables
         self.task_string_var = ttk.StringVar()
+        self.filter_string_var = ttk.StringVar()
         self.date_var = datetime.today().strftime(r'%x')
 
-        # load tasks and set task list variable
-        self.load_task_from_file()
-        self.task_list_var = tk.Variable(value=self.data_task_list)
-
         # create layout
         self.frame_date_selection()
         self.frame_new_task()
+        self.frame_task_filter()
         self.frame_task_list()
         self.frame_task_options()
+        self.data_widgets_state('disabled')
+        startup_profile.mark('layout created')
 
         # configure title bar's X button action
         self.protocol('WM_DELETE_WINDOW', self.exit_by_x)
 
-        # bind ESCAPE key press
-        self.bind('<KeyPress-Escape>', lambda event: self.widgets_reset())
+        # load tasks when window is shown
+        self.bind('<Map>', self.window_mapped)
+
+        # check errors reported by writer thread
+        self.after(500, self.storage_errors_check)
+
+        # detect event loop stalls and show stats with F12
+        if instrument.enabled:
+            instrument.StallDetector(self).start()
+            self.bind('<F12>', lambda event: self.open_stats_window())
 
         # run app
         self.mainloop()
 
+    def window_mapped(self, event):
+        if event.widget is self:
+            self.unbind('<Map>')
+            self.after_idle(self.start_data_load)
+
+    def start_data_load(self):
+        # load tasks and indexes on worker thread, so window is painted at once
+        startup_profile.mark('first paint')
+        current_task_date = self.date_var
+
+        def load():
+            self.store.tasks(current_task_date, pin=True)
+            self.store.occurrences(current_task_date)
+            self.missing_indexes = self.store.load_indexes()
+
+        self.data_load_thread = threading.Thread(target=load, daemon=True)
+        self.data_load_thread.start()
+        self.data_load_check()
+
+    def data_load_check(self):
+        if self.data_load_thread.is_alive():
+            self.after(10, self.data_load_check)
+            return
+
+        # month is already in cache
+        self.load_task_from_file()
+        self.show_tasks()
+        self.data_widgets_state('normal')
+
+        # bind ESCAPE and CTRL+F key press
+        self.bind('<KeyPress-Escape>', lambda event: self.widgets_reset())
+        self.bind('<Control-f>', lambda event: self.open_search_window())
+        self.bind('<Control-r>', lambda event: self.open_range_window())
+        self.bind('<Control-z>', lambda event: self.undo_task_action())
+
+        # create indexes missing for tasks saved before indexes were available
+        if self.missing_indexes:
+            self.rebuild_indexes(self.missing_indexes)
+
+        # show changes of current day made by other app windows and scripts
+        if isinstance(self.store, RemoteStore):
+            self.after(ToDoApp.server_check_interval, self.server_changes_check)
+
+        # move old months to archive in background
+        if ToDoApp.archive_after_months is not None:
+            threading.Thread(
+                target=self.store.archive_old_months,
+                args=(ToDoApp.archive_after_months,),
+                daemon=True
+            ).start()
+
+        startup_profile.mark('tasks loaded')
+        if startup_profile.enabled:
+            startup_profile.report()
+
+    def data_widgets_state(self, state):
+        # widgets which change tasks are disabled until tasks are loaded
+        self.new_task_field.configure(state=state)
+        self.calendar_button.configure(state=state)
+        for button in (self.add_task_button, self.select_date_button, self.search_button, self.range_button):
+            button.configure(state='enabled' if state == 'normal' else state)
+
     def frame_date_selection(self):
         frame = ttk.Frame(self)
 
@@ -73,6 +202,8 @@ class ToDoApp(ttk.Window):
 
         self.calendar_button = CustomDateEntry(frame, width=10, bootstyle='secondary', firstweekday=0)
         self.calendar_button.button_focus_disable()
+        self.calendar_button.date_ask_callback = self.prefetch_adjacent_months
+        self.calendar_button.day_marker = self.calendar_day_marker
         if self.theme_file_check:
             self.calendar_button.entry_configure('primary', self.main_font)
         else:
@@ -88,6 +219,24 @@ class ToDoApp(ttk.Window):
         )
         self.select_date_button.pack(side='right')
 
+        self.search_button = ttk.Button(
+            frame,
+            text='Search',
+            bootstyle='secondary-TButton',
+            takefocus=False,
+            command=self.open_search_window
+        )
+        self.search_button.pack(side='right', padx=10)
+
+        self.range_button = ttk.Button(
+            frame,
+            text='Range',
+            bootstyle='secondary-TButton',
+            takefocus=False,
+            command=self.open_range_window
+        )
+        self.range_button.pack(side='right')
+
         frame.pack(side='top', padx=15, pady=15, fill='x')
 
     def frame_new_task(self):
@@ -109,22 +258,56 @@ class ToDoApp(ttk.Window):
         )
         self.add_task_button.pack(side='right')
 
+        # new task is added once or as recurring task from current day
+        self.repeat_box = ttk.Combobox(
+            frame,
+            values=['Once'] + list(RULE_KINDS.values()),
+            state='readonly',
+            width=12
+        )
+        self.repeat_box.current(0)
+        self.repeat_box.pack(side='right', padx=10)
+
         frame.pack(side='top', padx=15, fill='x')
 
+    def frame_task_filter(self):
+        frame = ttk.Frame(self)
+
+        self.filter_label = ttk.Label(frame, text='Filter:', font=self.main_font)
+        self.filter_label.pack(side='left', padx=3)
+
+        self.filter_field = ttk.Entry(frame, font=self.main_font, textvariable=self.filter_string_var)
+        self.filter_field.pack(side='left', padx=10, fill='x', expand=True)
+        self.filter_field.bind('<KeyPress-Escape>', lambda event: self.filter_reset())
+        self.filter_string_var.trace_add('write', lambda *args: self.filter_query_changed())
+
+        self.sort_mode_box = ttk.Combobox(frame, values=list(SORT_MODES.values()), state='readonly', width=12)
+        self.sort_mode_box.current(0)
+        self.sort_mode_box.pack(side='right')
+        self.sort_mode_box.bind('<<ComboboxSelected>>', lambda event: self.filter_mode_changed())
+
+        self.status_filter_box = ttk.Combobox(frame, values=list(STATUS_FILTERS.values()), state='readonly', width=8)
+        self.status_filter_box.current(0)
+        self.status_filter_box.pack(side='right', padx=10)
+        self.status_filter_box.bind('<<ComboboxSelected>>', lambda event: self.filter_mode_changed())
+
+        frame.pack(side='top', padx=15, pady=(10, 0), fill='x')
+
     def frame_task_list(self):
         frame = ttk.Frame(self)
 
         self.date_label = ttk.Label(frame, text=f'Tasks for day {self.date_var}', font=self.main_font)
         self.date_label.pack(side='top', fill='x')
 
-        self.task_list = tk.Listbox(
+        self.task_list = VirtualListbox(
             frame,
-            listvariable=self.task_list_var,
-            selectmode=tk.SINGLE,
+            row_text=Task.display,
+            row_style=self.task_row_style,
+            selectmode=tk.EXTENDED,
             height=11,
             font=self.main_font,
         )
-        self.load_completed_task()
+        self.task_list.set_items(self.data_dict_items_list)
 
         self.task_list_scrollbar = tk.Scrollbar(self.task_list, orient='vertical', command=self.task_list.yview)
         self.task_list.configure(yscrollcommand=self.task_list_scrollbar.set)
@@ -133,6 +316,18 @@ class ToDoApp(ttk.Window):
 
         self.task_list.bind('<<ListboxSelect>>', self.task_completion_and_edit_button_update)
         self.task_list.bind('<Delete>', lambda event: self.delete_task())
+        self.task_list.bind('<Control-a>', lambda event: self.select_all_tasks())
+        self.task_list.bind('<Button-3>', self.task_menu_popup)
+
+        # actions of selected tasks shown with right click
+        self.task_menu = tk.Menu(self, tearoff=0)
+        self.task_menu.add_command(label='Mark done', command=lambda: self.set_selected_tasks_done(True))
+        self.task_menu.add_command(label='Uncheck', command=lambda: self.set_selected_tasks_done(False))
+        self.task_menu.add_command(label='Move to date...', command=self.move_selected_tasks)
+        self.task_menu.add_command(label='Delete', command=self.delete_task)
+        self.task_menu.add_command(label='Stop repeating', command=self.stop_selected_rules)
+        self.task_menu.add_separator()
+        self.task_menu.add_command(label='Undo', accelerator='Ctrl+Z', command=self.undo_task_action)
 
         frame.pack(side='top', padx=40, pady=15, fill='x')
 
@@ -175,147 +370,334 @@ class ToDoApp(ttk.Window):
         frame.pack(side='top', padx=40, pady=5, fill='x')
 
     def task_list_scrollbar_update(self):
-        if len(self.data_task_list) > 11:
+        if len(self.task_list.items) > 11:
             self.task_list_scrollbar.place(relx=1, rely=0, relheight=1, anchor='ne')
         else:
             self.task_list_scrollbar.place_forget()
 
     def add_new_task(self):
         if self.task_string_var.get() != '':
-            self.data_dict_items_list.append([self.task_string_var.get().strip(), False])
-            self.data_task_list.append(self.task_string_var.get().strip())
-            self.task_list_var.set(self.data_task_list)
+            if self.repeat_box.current() > 0:
+                self.add_recurring_task(self.task_string_var.get().strip())
+                return
+            self.store.add(self.date_var, self.task_string_var.get().strip())
+            if self.task_view.active:
+                self.show_tasks(keep_position=True)
+            else:
+                self.task_view.task_inserted(len(self.data_dict_items_list) - 1)
+                self.task_list.row_inserted(len(self.data_dict_items_list) - 1)
             self.task_string_var.set('')
             self.task_list_scrollbar_update()
             self.task_list.select_clear(0, 'end')
             self.widgets_reset()
 
+    def add_recurring_task(self, text):
+        kind = list(RULE_KINDS)[self.repeat_box.current() - 1]
+        interval = 1
+        if kind == 'every':
+            from ttkbootstrap.dialogs import Querybox
+            interval = Querybox.get_integer(
+                'Repeat every N days:',
+                title='Recurring task',
+                initialvalue=2,
+                minvalue=1,
+                parent=self
+            )
+            if interval is None:
+                return
+        self.store.add_rule(text, kind, self.date_var, interval)
+        self.repeat_box.current(0)
+        self.load_task_from_file()
+        self.show_tasks(keep_position=True)
+        self.widgets_reset()
+
     def delete_task(self):
-        if self.task_list.curselection() != ():
-            task_idx = self.task_list.curselection()[0]
-            del self.data_dict_items_list[task_idx]
-            del self.data_task_list[task_idx]
-            self.task_list_var.set(self.data_task_list)
-            self.load_completed_task()
-            self.task_list_scrollbar_update()
+        selection, occurrences = self.split_selection(self.selected_task_indices())
+        if selection != () or occurrences:
+            self.store.delete_many(self.date_var, selection)
+            # deleted occurrence is skipped, rule repeats on other days
+            for occurrence in occurrences:
+                self.store.skip_occurrence(occurrence)
+            if occurrences:
+                self.load_task_from_file()
+                self.show_tasks(keep_position=True)
+            else:
+                self.task_list_update(selection, deleted=True)
             self.widgets_reset(erase=False)
 
     def task_completion_button_action(self):
-        if self.task_list.curselection() != ():
-            task_idx = self.task_list.curselection()[0]
-            if self.data_dict_items_list[task_idx][1]:
-                self.data_dict_items_list[task_idx][1] = False
-                self.data_dict_items_list[task_idx][0] = self.data_dict_items_list[task_idx][0][2:]
-                self.data_task_list[task_idx] = self.data_task_list[task_idx][2:]
-                self.task_completion_undo_format()
-            else:
-                self.data_dict_items_list[task_idx][1] = True
-                self.data_dict_items_list[task_idx][0] = '\u2713 ' + self.data_dict_items_list[task_idx][0]
-                self.data_task_list[task_idx] = '\u2713 ' + self.data_task_list[task_idx]
-                self.task_completion_format()
-            self.task_list_var.set(self.data_task_list)
-            self.task_list.select_clear(0, 'end')
+        selection = self.selected_task_indices()
+        if selection != ():
+            # uncheck only when all selected tasks are done
+            done = not all(self.task_view.items[idx].done for idx in selection)
+            self.set_selected_tasks_done(done)
+        self.widgets_reset(erase=False)
+
+    def set_selected_tasks_done(self, done):
+        indices = self.selected_task_indices()
+        selection, occurrences = self.split_selection(indices)
+        if indices != ():
+            self.store.set_done_many(self.date_var, selection, done)
+            for occurrence in occurrences:
+                self.store.set_occurrence_done(occurrence, done)
+            self.task_list_update(indices)
+            self.widgets_reset(erase=False)
+
+    def stop_selected_rules(self):
+        # selected recurring tasks do not repeat from current day on
+        selection, occurrences = self.split_selection(self.selected_task_indices())
+        if occurrences:
+            last_day = datetime.strptime(self.date_var, r'%x').date() - timedelta(days=1)
+            for occurrence in occurrences:
+                self.store.end_rule(occurrence.rule_id, last_day)
+            self.load_task_from_file()
+            self.show_tasks(keep_position=True)
+        self.widgets_reset(erase=False)
+
+    def move_selected_tasks(self):
+        # recurring tasks are not moved
+        selection = self.split_selection(self.selected_task_indices())[0]
+        if selection == ():
+            return
+        to_date = CustomQuerybox.get_date(
+            parent=self.task_list,
+            startdate=datetime.strptime(self.date_var, r'%x'),
+            firstweekday=0,
+            bootstyle='secondary',
+            day_marker=self.calendar_day_marker,
+        )
+        if to_date is not None and self.store.move_many(self.date_var, selection, to_date):
+            self.task_list_update(selection, deleted=True)
         self.widgets_reset(erase=False)
 
+    def undo_task_action(self):
+        if self.task_index is not None:
+            # task is being edited
+            return
+        if self.date_var in self.store.undo():
+            self.load_task_from_file()
+            self.show_tasks(keep_position=True)
+        self.widgets_reset(erase=False)
+
+    def task_list_update(self, indices, deleted=False):
+        # single row is updated in place, changes of many rows (or of
+        # filtered or sorted list) are rendered once
+        if self.task_view.active or len(indices) != 1:
+            self.show_tasks(keep_position=True)
+            return
+        if deleted:
+            self.task_view.task_deleted(indices[0])
+            self.task_list.row_deleted(indices[0])
+        else:
+            self.task_view.invalidate()
+            self.task_list.row_changed(indices[0])
+        self.task_list_scrollbar_update()
+
+    def selected_task_indices(self):
+        # indices in task_view.items of selected rows
+        return tuple(sorted(self.task_view.task_index(row) for row in self.task_list.curselection()))
+
+    def split_selection(self, selection):
+        # indices in data_dict_items_list and selected occurrences of recurring tasks
+        count = len(self.data_dict_items_list)
+        return (
+            tuple(idx for idx in selection if idx < count),
+            [self.task_view.items[idx] for idx in selection if idx >= count]
+        )
+
+    def show_tasks(self, keep_position=False):
+        # show tasks of current day through filter and sort view
+        self.task_view.set_tasks(self.data_dict_items_list, self.occurrence_list)
+        if keep_position:
+            self.task_list.select_clear(0, 'end')
+            self.task_list.items = self.task_view.rows()
+            self.task_list.refresh()
+        else:
+            self.task_list.set_items(self.task_view.rows())
+        self.task_list_scrollbar_update()
+
+    def filter_query_changed(self):
+        self.task_view.set_query(self.filter_string_var.get())
+        self.task_list.set_items(self.task_view.rows())
+        self.task_list_scrollbar_update()
+
+    def filter_mode_changed(self):
+        self.task_view.set_status(list(STATUS_FILTERS)[self.status_filter_box.current()])
+        self.task_view.set_sort(list(SORT_MODES)[self.sort_mode_box.current()])
+        self.task_list.set_items(self.task_view.rows())
+        self.task_list_scrollbar_update()
+
+    def filter_reset(self):
+        self.status_filter_box.current(0)
+        self.sort_mode_box.current(0)
+        self.task_view.set_status('all')
+        self.task_view.set_sort('position')
+        self.filter_string_var.set('')
+
+    def select_all_tasks(self):
+        if self.task_index is None and self.task_list.items:
+            self.task_list.selection_set(0, 'end')
+            self.task_list.event_generate('<<ListboxSelect>>')
+        return 'break'
+
+    def task_menu_popup(self, event):
+        if self.task_index is not None or not self.task_list.items:
+            return
+        # right click on row which is not selected selects only that row
+        idx = self.task_list.top + self.task_list.nearest(event.y)
+        if idx not in self.task_list.curselection():
+            self.task_list.select_clear(0, 'end')
+            self.task_list.selection_set(idx)
+            self.task_list.event_generate('<<ListboxSelect>>')
+        self.task_menu.tk_popup(event.x_root, event.y_root)
+
     def task_completion_and_edit_button_update(self, event):
-        if len(self.data_task_list) > 0 and event.widget.curselection():
-            task_idx = self.task_list.curselection()[0]
+        selection = self.selected_task_indices()
+        if len(self.task_view.items) > 0 and selection:
             self.task_completion_button.configure(state='enabled')
-            self.edit_task_button.configure(state='enabled')
+            # only single task can be edited
+            self.edit_task_button.configure(state='enabled' if len(selection) == 1 else 'disabled')
             self.delete_task_button.configure(state='enabled')
-            if self.data_dict_items_list[task_idx][1]:
+            if all(self.task_view.items[idx].done for idx in selection):
                 self.task_completion_button.configure(text='Uncheck task')
             else:
                 self.task_completion_button.configure(text='Task done')
 
-    def load_completed_task(self):
-        for idx, item in enumerate(self.data_dict_items_list):
-            self.task_list.selection_set(idx)
-            if item[1]:
-                self.task_completion_format()
-            else:
-                self.task_completion_undo_format()
-            self.task_list.select_clear(idx)
-
-    def task_completion_format(self):
-        task_idx = self.task_list.curselection()[0]
-        self.task_list.itemconfig(
-            task_idx,
-            fg='#efefef',
-            selectforeground='#252525',
-            selectbackground='#95a5a6'
-        )
-
-    def task_completion_undo_format(self):
-        task_idx = self.task_list.curselection()[0]
-        self.task_list.itemconfig(
-            task_idx,
-            fg='#212529',
-            selectbackground='#95a5a6'
-        )
+    def task_row_style(self, idx):
+        if self.task_list.items[idx].done:
+            return ToDoApp.completed_task_style
+        return ToDoApp.pending_task_style
 
     def load_task_from_file(self):
-        file_path = os.path.join(ToDoApp.main_path, 'data', 'app_data')
-        current_task_date = datetime.strptime(self.date_var, r'%x').strftime('%Y_%m')
-        file = f'task_data_{current_task_date}.dat'
-        print(file)
-        print(os.path.join(file_path, file))
-        if os.path.exists(file_path) and os.path.isfile(os.path.join(file_path, file)):
-            with open(os.path.join(file_path, file), 'rb') as f:
-                self.data_dict_var = pickle.load(f)
-            self.data_dict_items_list = self.data_dict_var.get(self.date_var, [])
-            self.data_task_list = [item[0] for item in self.data_dict_items_list]
-        else:
-            self.data_dict_var = {}
-            self.data_dict_items_list = []
-            self.data_task_list = []
-
-    def save_task_to_file(self):
-        self.data_dict_var_update()
-        file_path = os.path.join(ToDoApp.main_path, 'data', 'app_data')
-        current_task_date = datetime.strptime(self.date_var, r'%x').strftime('%Y_%m')
-        file = f'task_data_{current_task_date}.dat'
-        if len(self.data_dict_var) > 0:
-            if not os.path.exists(file_path):
-                os.mkdir(file_path)
-            with open(os.path.join(file_path, file), 'wb') as f:
-                pickle.dump(self.data_dict_var, f)
-        else:
-            if os.path.exists(file_path) and os.path.isfile(os.path.join(file_path, file)):
-                os.remove(os.path.join(file_path, file))
+        self.data_dict_items_list = self.store.tasks(self.date_var, pin=True)
+        self.occurrence_list = self.store.occurrences(self.date_var)
+
+    def prefetch_adjacent_months(self, start_date):
+        # called when calendar is opened, so switching to neighbouring month
+        # does not wait for disk
+        self.store.month_cache.prefetch(adjacent_months(start_date.strftime('%Y_%m')))
 
     def load_task_for_date(self):
         self.widgets_reset(erase=False)
-        # check if year and month change
-        current_task_date = datetime.strptime(self.date_var, r'%x').strftime('%Y_%m')
-        selected_task_date = datetime.strptime(self.calendar_button.entry.get(), r'%x').strftime('%Y_%m')
-        if current_task_date == selected_task_date:
-            self.data_dict_var_update()
-            self.date_var = self.calendar_button.entry.get()
-            self.data_dict_items_list = self.data_dict_var.get(self.date_var, [])
-            self.data_task_list = [item[0] for item in self.data_dict_items_list]
-        else:
-            self.save_task_to_file()
-            self.date_var = self.calendar_button.entry.get()
-            self.load_task_from_file()
-        self.task_list_var.set(self.data_task_list)
-        self.load_completed_task()
+        self.date_var = self.calendar_button.entry.get()
+        self.load_task_from_file()
+        self.show_tasks()
         self.date_label.configure(text=f'Tasks for day {self.date_var}')
 
-    def data_dict_var_update(self):
-        size = len(self.data_dict_items_list)
-        if size > 0:
-            self.data_dict_var[self.date_var] = self.data_dict_items_list
-        elif size == 0 and self.date_var in self.data_dict_var:
-            del self.data_dict_var[self.date_var]
+    def server_changes_check(self):
+        # tasks being edited are reloaded when editing ends
+        if self.task_index is None and self.store.pop_changed(self.date_var):
+            self.load_task_from_file()
+            self.show_tasks(keep_position=True)
+            self.widgets_reset(erase=False)
+        self.after(ToDoApp.server_check_interval, self.server_changes_check)
+
+    def storage_errors_check(self):
+        errors = []
+        while not self.store.writer.errors.empty():
+            errors.append(self.store.writer.errors.get())
+        if errors:
+            from ttkbootstrap.dialogs import Messagebox
+            message = '\n'.join(f'{month}: {error}' for month, error in errors)
+            Messagebox.show_error(f'Saving tasks failed:\n{message}', title='Error', parent=self)
+        self.after(500, self.storage_errors_check)
+
+    def open_search_window(self):
+        if self.search_window is not None and self.search_window.winfo_exists():
+            self.search_window.lift()
+            return
+        self.search_window = SearchWindow(
+            self,
+            search=self.store.search_index.search,
+            on_select=self.show_search_result,
+            on_rebuild=self.rebuild_search_index,
+            font=self.main_font
+        )
+
+    def open_range_window(self):
+        if self.range_window is not None and self.range_window.winfo_exists():
+            self.range_window.lift()
+            return
+        self.range_window = RangeWindow(
+            self,
+            iter_days=self.store.iter_days,
+            on_select=self.show_search_result,
+            font=self.main_font,
+            start_date=datetime.strptime(self.date_var, r'%x')
+        )
+
+    def open_stats_window(self):
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        self.stats_window = StatsWindow(self, rows=instrument.rows)
+
+    def show_search_result(self, day, task_id):
+        if self.task_index is not None:
+            # task is being edited
+            return
+        self.calendar_button.entry.delete(0, 'end')
+        self.calendar_button.entry.insert('end', locale_date(day))
+        self.load_task_for_date()
+        for idx, task in enumerate(self.data_dict_items_list):
+            if task.id == task_id:
+                if self.task_view.row_index(idx) is None:
+                    # task is hidden by filter
+                    self.filter_reset()
+                idx = self.task_view.row_index(idx)
+                self.task_list.see(idx)
+                self.task_list.selection_set(idx)
+                self.task_list.event_generate('<<ListboxSelect>>')
+                break
+
+    def rebuild_search_index(self):
+        self.rebuild_indexes([self.store.search_index])
+
+    def rebuild_indexes(self, indexes):
+        if self.index_rebuild_running():
+            return
+        # indexes are built from storage, so all changes have to be written first
+        self.store.flush()
+        self.index_rebuild_thread = threading.Thread(
+            target=self.store.rebuild_indexes,
+            kwargs={'indexes': indexes, 'flush': False},
+            daemon=True
+        )
+        self.index_rebuild_thread.start()
+        self.index_rebuild_check()
+
+    def index_rebuild_running(self):
+        return self.index_rebuild_thread is not None and self.index_rebuild_thread.is_alive()
+
+    def index_rebuild_check(self):
+        search_window_open = self.search_window is not None and self.search_window.winfo_exists()
+        if self.index_rebuild_running():
+            if search_window_open:
+                self.search_window.set_status('Rebuilding search index...')
+            self.after(100, self.index_rebuild_check)
+        elif search_window_open:
+            self.search_window.start_search()
+
+    def calendar_day_marker(self, day):
+        # marker shown next to day number in calendar
+        total, done = self.store.day_summary.get(day.strftime('%Y-%m-%d'))
+        if total == 0:
+            return ''
+        if done == total:
+            return '\u2713'
+        if day < date.today():
+            return '!'
+        return '\u2022'
 
     def exit_by_x(self):
-        self.save_task_to_file()
+        # writes not finished in time are completed by writer thread after
+        # window is closed
+        self.store.close(ToDoApp.exit_flush_timeout, save_indexes=not self.index_rebuild_running())
         self.destroy()
 
     def edit_button_action(self):
         # set index variable and widgets display configuration
-        self.task_index = self.task_list.curselection()[0]
+        self.task_index = self.selected_task_indices()[0]
         self.task_completion_button.configure(state='disabled')
         self.delete_task_button.configure(state='disabled')
         self.select_date_button.configure(state='disabled')
@@ -333,10 +715,7 @@ class ToDoApp(ttk.Window):
         self.new_task_field.bind('<Return>', lambda event: self.edit_task())
 
         # set task entry variable
-        if self.data_dict_items_list[self.task_index][1]:
-            self.task_string_var.set(self.task_list.get(self.task_index)[2:])
-        else:
-            self.task_string_var.set(self.task_list.get(self.task_index))
+        self.task_string_var.set(self.task_view.items[self.task_index].text)
 
     def widgets_reset(self, erase=True):
         # reset widgets display configuration
@@ -366,12 +745,15 @@ class ToDoApp(ttk.Window):
 
     def edit_task(self):
         if self.task_string_var.get() != '':
-            if self.data_dict_items_list[self.task_index][1]:
-                task_text = '\u2713 ' + self.task_string_var.get().strip()
+            task = self.task_view.items[self.task_index]
+            if isinstance(task, Occurrence):
+                self.store.edit_occurrence(task, self.task_string_var.get().strip())
+            else:
+                self.store.edit(self.date_var, self.task_index, self.task_string_var.get().strip())
+            if self.task_view.active:
+                self.show_tasks(keep_position=True)
             else:
-                task_text = self.task_string_var.get().strip()
-            self.data_dict_items_list[self.task_index][0] = task_text
-            self.data_task_list[self.task_index] = task_text
-            self.task_list_var.set(self.data_task_list)
+                self.task_view.invalidate()
+                self.task_list.row_changed(self.task_index)
             self.task_list_scrollbar_update()
         self.widgets_reset()
@@ -1,4 +1,11 @@
-from todo_app import ToDoApp
+import os.path
+import sys
+
+# started as `python ToDoList/todolist.py`: parent directory replaces
+# package directory in module search path, so app is imported as package
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from ToDoList.cli import main
 
 if __name__ == '__main__':
-    ToDoApp()
+    main()
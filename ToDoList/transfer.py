@@ -0,0 +1,280 @@
+"""Streaming import and export of tasks as CSV or JSON Lines.
+
+Every row is one task: date ('YYYY-MM-DD'), text, done, id, created and
+updated time. Rows are passed through generators, so only one month of
+tasks (export) or `buffer_size` rows (import) are held in memory.
+"""
+import csv
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from datetime import date as date_type
+
+from .model import Task, new_task_id
+from .storage import iso_date, locale_date
+
+
+FIELDS = ('date', 'text', 'done', 'id', 'created', 'updated')
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'x', '✓')
+
+
+def file_format(path, fmt=None):
+    """Return format given explicitly or by file extension"""
+    if fmt is not None:
+        return fmt
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f'Cannot tell format of {path!r}, use --format')
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_jsonl(file):
+    for line_number, line in enumerate(file, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'line {line_number}: {e}') from None
+
+
+def write_csv(rows, file):
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow(FIELDS)
+    for row in rows:
+        row['done'] = int(row['done'])
+        writer.writerow([row[field] for field in FIELDS])
+        yield row
+
+
+def write_jsonl(rows, file):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for row in rows:
+        file.write(dumps(row))
+        file.write('\n')
+        yield row
+
+
+readers = {'csv': read_csv, 'jsonl': read_jsonl}
+writers = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def parse_done(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def row_to_record(row, now):
+    day = row['date'].strip()
+    date_type.fromisoformat(day)
+    if not isinstance(row['text'], str):
+        raise ValueError(f'text is not a string: {row["text"]!r:.40}')
+    task_id = row.get('id')
+    created = row.get('created')
+    updated = row.get('updated')
+    created = float(created) if created not in (None, '') else now
+    return day, (
+        int(task_id) if task_id not in (None, '') else new_task_id(),
+        row['text'],
+        parse_done(row.get('done', False)),
+        created,
+        float(updated) if updated not in (None, '') else created,
+    )
+
+
+def rows_to_records(rows):
+    """Convert rows to (iso day, record) pairs; missing id and times are generated"""
+    now = time.time()
+    for row_number, row in enumerate(rows, 1):
+        try:
+            yield row_to_record(row, now)
+        except KeyError as e:
+            raise ValueError(f'row {row_number}: missing field {e}') from None
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f'row {row_number}: {e}') from None
+
+
+def month_rows(storage, month):
+    """Rows of one stored month in date order"""
+    data_dict = storage.load_month(month)
+    for day, date in sorted((iso_date(date), date) for date in data_dict):
+        for task in data_dict[date]:
+            yield {
+                'date': day,
+                'text': task.text,
+                'done': task.done,
+                'id': task.id,
+                'created': task.created,
+                'updated': task.updated,
+            }
+
+
+def export_rows(storage):
+    """Rows of all stored months, loading one month at a time"""
+    for month in storage.months():
+        yield from month_rows(storage, month)
+
+
+class MonthSpool:
+    """Imported records grouped by month.
+
+    When more than `buffer_size` records are buffered, they are appended
+    to per-month temporary files, so memory stays bounded for inputs which
+    are not sorted by date.
+    """
+
+    def __init__(self, buffer_size=100000):
+        self.buffer_size = buffer_size
+        self.buffers = {}
+        self.buffered = 0
+        self.spilled = set()
+        self._directory = None
+
+    def add(self, day, record):
+        month = day[:4] + '_' + day[5:7]
+        if month not in self.buffers:
+            self.buffers[month] = []
+        self.buffers[month].append((day, record))
+        self.buffered += 1
+        if self.buffered >= self.buffer_size:
+            self.spill()
+
+    def _spool_path(self, month):
+        return os.path.join(self._directory.name, month)
+
+    def spill(self):
+        if self._directory is None:
+            self._directory = tempfile.TemporaryDirectory(prefix='todo-import-')
+        for month, items in self.buffers.items():
+            with open(self._spool_path(month), 'ab') as f:
+                pickle.dump(items, f, pickle.HIGHEST_PROTOCOL)
+            self.spilled.add(month)
+        self.buffers = {}
+        self.buffered = 0
+
+    def months(self):
+        return sorted(self.spilled.union(self.buffers))
+
+    def items(self, month):
+        """(iso day, record) pairs of month in input order"""
+        if month in self.spilled:
+            with open(self._spool_path(month), 'rb') as f:
+                while True:
+                    try:
+                        yield from pickle.load(f)
+                    except EOFError:
+                        break
+        yield from self.buffers.get(month, ())
+
+    def close(self):
+        if self._directory is not None:
+            self._directory.cleanup()
+
+
+def import_records(store, records, buffer_size=100000, indexes=()):
+    """Add records to stored months, writing each month once.
+
+    Tasks with id already stored in month are skipped, so importing exported
+    file twice does not duplicate tasks; rows without id get new id and are
+    always added. Returns number of added tasks.
+    """
+    spool = MonthSpool(buffer_size)
+    added = 0
+    try:
+        for day, record in records:
+            spool.add(day, record)
+        dates = {}
+        for month in spool.months():
+            data_dict = store.storage.load_month(month)
+            ids = {task.id for tasks in data_dict.values() for task in tasks}
+            for day, record in spool.items(month):
+                if record[0] in ids:
+                    continue
+                ids.add(record[0])
+                if day not in dates:
+                    dates[day] = locale_date(day)
+                task = Task.from_record(record)
+                data_dict.setdefault(dates[day], []).append(task)
+                for index in indexes:
+                    if index is store.search_index:
+                        index.index_task(dates[day], task)
+                    else:
+                        index.task_changed(dates[day], 'add', task)
+                added += 1
+            store.storage.save_month(month, data_dict)
+    finally:
+        spool.close()
+    return added
+
+
+def counted(rows, counter):
+    """Pass rows through, counting them in counter[0]"""
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+def report(action, count, start, file=sys.stderr):
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f'{action} {count} rows in {elapsed:.2f} s ({count / elapsed:,.0f} rows/s)', file=file)
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    return open(path, encoding='utf-8', newline='')
+
+
+def open_output(path):
+    if path == '-':
+        return sys.stdout
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def import_file(store, path, fmt=None, buffer_size=100000):
+    """Import CSV or JSON Lines file into store; returns (rows read, tasks added)"""
+    fmt = file_format(path, fmt) if path != '-' else fmt or 'jsonl'
+    start = time.perf_counter()
+    # derived indexes missing on disk are rebuilt by the app on start
+    missing_indexes = store.load_indexes()
+    indexes = [index for index in (store.search_index, store.day_summary) if index not in missing_indexes]
+    counter = [0]
+    # months are saved directly to storage, not through store changes
+    store.mark_indexes_dirty()
+    file = open_input(path)
+    try:
+        added = import_records(store, rows_to_records(counted(readers[fmt](file), counter)), buffer_size, indexes)
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    store.save_indexes()
+    report('Imported', counter[0], start)
+    return counter[0], added
+
+
+def export_file(store, path, fmt=None):
+    """Export all stored tasks to CSV or JSON Lines file; returns number of rows"""
+    fmt = file_format(path, fmt) if path != '-' else fmt or 'jsonl'
+    start = time.perf_counter()
+    count = 0
+    file = open_output(path)
+    try:
+        for _ in writers[fmt](export_rows(store.storage), file):
+            count += 1
+    finally:
+        if file is not sys.stdout:
+            file.close()
+        else:
+            file.flush()
+    report('Exported', count, start)
+    return count
@@ -0,0 +1,128 @@
+import atexit
+import queue
+import threading
+import time
+from collections import Counter
+
+from .storage import write_file_atomic
+
+
+def snapshot_month(data_dict):
+    """Copy month dictionary, so app can keep changing it while it is written"""
+    return {date: [task.copy() for task in tasks] for date, tasks in data_dict.items()}
+
+
+class WriteBehind:
+    """Storage writes done on background thread.
+
+    Change records are written in order; records submitted together (or
+    queued one after another for the same month) are passed to storage in
+    one `record_many` call. Month saves and other file writes
+    are coalesced: if the same month (file) is submitted again before it was
+    written, only the newest snapshot is saved. Errors are collected in `errors` queue as
+    (month, exception) tuples for the app to show.
+
+    Writes still pending when the process exits (window closed before they
+    were done, `close` never called after an error or Ctrl+C) are finished
+    by exit handler, which waits at most `exit_timeout` seconds; writer
+    thread is a daemon thread, so it never keeps the process alive.
+    """
+
+    # max time (seconds) process waits for pending writes on exit
+    exit_timeout = 10.0
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.errors = queue.Queue()
+        self._records = []
+        self._months = {}
+        self._files = {}
+        self._busy = Counter()
+        self._closing = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='todo-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self._close_at_exit)
+
+    def submit_record(self, month, record):
+        self.submit_records(month, [record])
+
+    def submit_records(self, month, records):
+        with self._condition:
+            if self._records and self._records[-1][0] == month:
+                self._records[-1][1].extend(records)
+            else:
+                self._records.append((month, list(records)))
+                self._busy[month] += 1
+            self._condition.notify_all()
+
+    def submit_month(self, month, data_dict):
+        data_dict = snapshot_month(data_dict)
+        with self._condition:
+            if month not in self._months:
+                self._busy[month] += 1
+            self._months[month] = data_dict
+            self._condition.notify_all()
+
+    def submit_file(self, path, data: bytes):
+        """Write data to file atomically"""
+        with self._condition:
+            if path not in self._files:
+                self._busy[path] += 1
+            self._files[path] = data
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._records and not self._months and not self._files and not self._closing:
+                    self._condition.wait()
+                if not self._records and not self._months and not self._files:
+                    return
+                records, self._records = self._records, []
+                months, self._months = self._months, {}
+                files, self._files = self._files, {}
+            for month, month_records in records:
+                self._write(month, self.storage.record_many, month_records)
+            for month, data_dict in months.items():
+                self._write(month, self.storage.save_month, data_dict)
+            for path, data in files.items():
+                self._write(path, write_file_atomic, data)
+
+    def _write(self, month, method, data):
+        try:
+            method(month, data)
+        except Exception as e:
+            self.errors.put((month, e))
+        finally:
+            with self._condition:
+                self._busy[month] -= 1
+                if self._busy[month] == 0:
+                    del self._busy[month]
+                self._condition.notify_all()
+
+    def wait_for(self, month, timeout=None):
+        """Wait until all writes of month are done; return False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: month not in self._busy, timeout)
+
+    def flush(self, timeout=None):
+        """Wait until all submitted writes are done; return False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._busy, timeout)
+
+    def _close_at_exit(self):
+        self.close(self.exit_timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting work and wait (at most timeout seconds) for pending writes"""
+        start = time.monotonic()
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        done = self.flush(timeout)
+        if done:
+            remaining = None if timeout is None else max(timeout - (time.monotonic() - start), 0)
+            self._thread.join(remaining)
+            atexit.unregister(self._close_at_exit)
+        return done
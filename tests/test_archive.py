@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from ToDoList.storage import PickleBackend
+
+
+DAY = date(2024, 1, 5).strftime(r'%x')
+
+
+def record(task_id, text, done=False):
+    return task_id, text, done, 1.0, 1.0
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        backend = PickleBackend(self.directory)
+        backend.record_many('2024_01', [('add', DAY, record(1, 'first')), ('add', DAY, record(2, 'second'))])
+        self.assertEqual(backend.archive_months('2024_02'), ['2024_01'])
+        backend.close()
+
+    def load(self):
+        return [task.text for task in PickleBackend(self.directory).load_month('2024_01').get(DAY, [])]
+
+    def test_archived_month_is_read_from_archive(self):
+        self.assertEqual(self.load(), ['first', 'second'])
+        self.assertEqual(PickleBackend(self.directory).months(), ['2024_01'])
+
+    def test_edit_of_archived_month_keeps_tasks(self):
+        backend = PickleBackend(self.directory)
+        backend.record('2024_01', ('edit', DAY, 1, record(2, 'second edited')))
+        backend.close()
+        self.assertEqual(self.load(), ['first', 'second edited'])
+        self.assertEqual(PickleBackend(self.directory).months(), ['2024_01'])
+
+    def test_emptied_archived_month_stays_empty(self):
+        for journal in (True, False):
+            with self.subTest(journal=journal):
+                backend = PickleBackend(self.directory, journal=journal)
+                backend.save_month('2024_01', {})
+                backend.close()
+                self.assertEqual(self.load(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
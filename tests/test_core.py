@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date
+
+from ToDoList.core import TaskStore, index_marker_path
+
+
+DAY = date(2024, 1, 5)
+
+
+class TaskStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+class IndexMarkerTest(TaskStoreTestCase):
+    def test_first_change_creates_missing_data_directory(self):
+        data_path = os.path.join(self.directory, 'new')
+        store = TaskStore(data_path)
+        # indexes missing in new directory are built as the app does
+        store.rebuild_indexes(store.load_indexes())
+        store.add(DAY, 'first')
+        self.assertTrue(os.path.isfile(index_marker_path(data_path)))
+        store.close()
+        self.assertFalse(os.path.exists(index_marker_path(data_path)))
+        self.assertEqual([task.text for task in TaskStore(data_path).tasks(DAY)], ['first'])
+
+
+class BatchTest(TaskStoreTestCase):
+    def test_bulk_changes_do_not_save_whole_month(self):
+        store = TaskStore(self.directory, storage_kind='pickle')
+        saved = []
+        save_month = store.storage.save_month
+        store.storage.save_month = lambda month, data_dict: saved.append(month) or save_month(month, data_dict)
+        for text in ('first', 'second', 'third'):
+            store.add(DAY, text)
+        store.set_done_many(DAY, [0], True)
+        store.delete_many(DAY, [1])
+        self.assertEqual(saved, [])
+        store.close()
+        self.assertEqual(saved, ['2024_01'])
+        tasks = TaskStore(self.directory, storage_kind='pickle').tasks(DAY)
+        self.assertEqual([(task.text, task.done) for task in tasks], [('first', True), ('third', False)])
+
+    def test_undo_reverts_whole_batch(self):
+        store = TaskStore(self.directory)
+        store.add(DAY, 'first')
+        with store.batch(undo=True):
+            store.add(DAY, 'second')
+            store.set_done(DAY, 0, True)
+            store.delete(DAY, 0)
+        self.assertEqual([task.text for task in store.tasks(DAY)], ['second'])
+        self.assertEqual(store.undo(), {DAY.strftime(r'%x')})
+        self.assertEqual([(task.text, task.done) for task in store.tasks(DAY)], [('first', False)])
+        store.close()
+        tasks = TaskStore(self.directory).tasks(DAY)
+        self.assertEqual([(task.text, task.done) for task in tasks], [('first', False)])
+
+
+class RangeTest(TaskStoreTestCase):
+    def test_days_of_range_across_months(self):
+        store = TaskStore(self.directory)
+        store.add(date(2024, 1, 31), 'january')
+        store.add(date(2024, 3, 1), 'march')
+        days = list(store.iter_days(date(2024, 1, 30), date(2024, 3, 1), workers=2))
+        self.assertEqual(len(days), 32)
+        self.assertEqual([(day, [task.text for task in tasks]) for day, tasks in days if tasks], [
+            (date(2024, 1, 31), ['january']),
+            (date(2024, 3, 1), ['march']),
+        ])
+        # generator closed early does not wait for months not read yet
+        days = store.iter_days(date(2020, 1, 1), date(2024, 12, 31), workers=2)
+        self.assertEqual(next(days)[0], date(2020, 1, 1))
+        days.close()
+        store.close()
+
+
+class WriteBehindTest(TaskStoreTestCase):
+    def test_day_of_evicted_month_is_loaded_after_pending_records(self):
+        store = TaskStore(self.directory, storage_kind='sqlite', month_cache_size=1, background=True)
+        record_many = store.storage.record_many
+
+        def slow_record_many(month, records):
+            time.sleep(0.2)
+            record_many(month, records)
+
+        store.storage.record_many = slow_record_many
+        store.add(DAY, 'first')
+        # month is evicted while its record is still queued
+        store.tasks(date(2024, 2, 1))
+        self.assertEqual([task.text for task in store.tasks(DAY)], ['first'])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
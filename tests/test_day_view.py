@@ -0,0 +1,102 @@
+import unittest
+from datetime import date
+
+from ToDoList.day_view import DayView
+from ToDoList.model import Task
+from ToDoList.recurring import RecurringTasks
+
+
+def tasks(*texts):
+    return [Task(text, done=text.startswith('done'), created=float(position)) for position, text in enumerate(texts)]
+
+
+def texts(view):
+    return [task.text for task in view.rows()]
+
+
+class DayViewTest(unittest.TestCase):
+    def setUp(self):
+        self.view = DayView()
+        self.view.set_tasks(tasks('Banana', 'apple', 'done cherry', 'done banana split'))
+
+    def test_inactive_view_shows_tasks_as_they_are(self):
+        self.assertFalse(self.view.active)
+        self.assertIs(self.view.rows(), self.view.tasks)
+        self.assertEqual(self.view.task_index(2), 2)
+
+    def test_query_is_narrowed_and_widened(self):
+        self.view.set_query('an')
+        self.assertEqual(texts(self.view), ['Banana', 'done banana split'])
+        self.view.set_query('BAN')
+        self.assertEqual(texts(self.view), ['Banana', 'done banana split'])
+        self.view.set_query('bana')
+        self.assertEqual(texts(self.view), ['Banana', 'done banana split'])
+        self.view.set_query('banana ')
+        self.assertEqual(texts(self.view), ['done banana split'])
+        # widened query checks all tasks again
+        self.view.set_query('a')
+        self.assertEqual(texts(self.view), ['Banana', 'apple', 'done banana split'])
+        self.view.set_query('')
+        self.assertIsNone(self.view.indices)
+
+    def test_status_filter_with_query(self):
+        self.view.set_query('an')
+        self.view.set_status('pending')
+        self.assertEqual(texts(self.view), ['Banana'])
+        self.view.set_status('done')
+        self.assertEqual(texts(self.view), ['done banana split'])
+        self.view.set_status('all')
+        self.assertEqual(texts(self.view), ['Banana', 'done banana split'])
+
+    def test_sort_modes(self):
+        self.view.set_sort('alphabetical')
+        self.assertEqual(texts(self.view), ['apple', 'Banana', 'done banana split', 'done cherry'])
+        self.view.set_sort('done_last')
+        self.assertEqual(texts(self.view), ['Banana', 'apple', 'done cherry', 'done banana split'])
+        self.view.set_query('ch')
+        self.assertEqual(texts(self.view), ['done cherry'])
+        self.assertEqual(self.view.task_index(0), 2)
+        self.assertEqual(self.view.row_index(2), 0)
+        self.assertIsNone(self.view.row_index(0))
+
+    def test_changed_text_is_found_after_refresh(self):
+        self.view.set_query('an')
+        self.view.tasks[1].text = 'mango'
+        self.view.refresh()
+        self.assertEqual(texts(self.view), ['Banana', 'mango', 'done banana split'])
+
+    def test_inactive_view_caches_are_dropped(self):
+        self.view.set_query('an')
+        self.view.set_query('')
+        self.view.tasks[1].text = 'mango'
+        self.view.invalidate()
+        self.view.set_query('an')
+        self.assertEqual(texts(self.view), ['Banana', 'mango', 'done banana split'])
+
+
+class OccurrenceRowsTest(unittest.TestCase):
+    def setUp(self):
+        recurring = RecurringTasks()
+        recurring.add_rule('water plants', 'daily', date(2024, 1, 1))
+        self.view = DayView()
+        self.view.set_tasks(tasks('first', 'second'), recurring.occurrences(date(2024, 1, 5)))
+
+    def test_occurrences_are_trailing_rows_of_inactive_view(self):
+        self.assertFalse(self.view.active)
+        self.assertEqual(texts(self.view), ['first', 'second', 'water plants'])
+
+    def test_single_task_changes_keep_occurrences_last(self):
+        rows = self.view.rows()
+        self.view.tasks.append(Task('third'))
+        self.view.task_inserted(2)
+        self.assertEqual([task.text for task in rows], ['first', 'second', 'third', 'water plants'])
+        del self.view.tasks[0]
+        self.view.task_deleted(0)
+        self.assertEqual([task.text for task in rows], ['second', 'third', 'water plants'])
+        self.view.set_query('t')
+        self.assertEqual(texts(self.view), ['third', 'water plants'])
+        self.assertEqual(self.view.task_index(1), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
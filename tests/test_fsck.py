@@ -0,0 +1,40 @@
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from ToDoList.core import TaskStore, index_marker_path
+from ToDoList.fsck import check_data_dir
+from ToDoList.storage import month_file_path
+
+
+class CheckOnlyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def search(self, store, query):
+        return [result for chunk in store.search_index.search(query) for result in chunk]
+
+    def test_old_records_are_indexed_by_app_after_check(self):
+        with open(month_file_path(self.directory, '2023_06'), 'wb') as f:
+            pickle.dump({'2023-06-12': [['✓ Task 1', True], ['Task 2', False]]}, f)
+        out = io.StringIO()
+        self.assertEqual(check_data_dir(self.directory, workers=1, out=out), 1)
+        self.assertIn('not indexed', out.getvalue())
+        self.assertTrue(os.path.isfile(index_marker_path(self.directory)))
+
+        store = TaskStore(self.directory)
+        missing = store.load_indexes()
+        self.assertEqual(len(missing), 2)
+        store.rebuild_indexes(missing)
+        self.assertEqual(len(self.search(store, 'task')), 2)
+        store.close()
+        self.assertFalse(os.path.exists(index_marker_path(self.directory)))
+        self.assertEqual(TaskStore(self.directory).load_indexes(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
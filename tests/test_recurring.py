@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from ToDoList.recurring import RecurringTasks, Rule
+
+
+class RuleTest(unittest.TestCase):
+    def days(self, rule, start, count):
+        return [day for day in (date.fromordinal(start.toordinal() + offset) for offset in range(count)) if rule.occurs(day)]
+
+    def test_weekdays_and_weekly(self):
+        # 2024-01-01 is Monday
+        weekdays = Rule('standup', 'weekdays', date(2024, 1, 1))
+        self.assertEqual(len(self.days(weekdays, date(2024, 1, 1), 14)), 10)
+        weekly = Rule('review', 'weekly', date(2024, 1, 3))
+        self.assertEqual(self.days(weekly, date(2024, 1, 1), 14), [date(2024, 1, 3), date(2024, 1, 10)])
+
+    def test_monthly_rule_started_on_31st_occurs_on_last_day(self):
+        rule = Rule('rent', 'monthly', date(2024, 1, 31))
+        self.assertTrue(rule.occurs(date(2024, 2, 29)))
+        self.assertTrue(rule.occurs(date(2024, 4, 30)))
+        self.assertFalse(rule.occurs(date(2023, 12, 31)))
+
+    def test_every_interval_and_end(self):
+        rule = Rule('backup', 'every', date(2024, 1, 1), interval=3, end=date(2024, 1, 10))
+        self.assertEqual(self.days(rule, date(2023, 12, 30), 20), [date(2024, 1, d) for d in (1, 4, 7, 10)])
+
+    def test_record_round_trip(self):
+        rule = Rule('backup', 'every', date(2024, 1, 1), interval=3, end=date(2024, 1, 10))
+        copy = Rule.from_record(rule.to_record())
+        self.assertEqual(copy.to_record(), rule.to_record())
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            Rule('x', 'yearly', date(2024, 1, 1))
+
+
+class RecurringTasksTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.recurring = RecurringTasks(os.path.join(self.directory, 'recurring_tasks.dat'))
+        self.rule = self.recurring.add_rule('water plants', 'daily', date(2024, 1, 1))
+
+    def test_overrides_of_single_day_are_saved(self):
+        day = date(2024, 1, 5)
+        occurrence, = self.recurring.occurrences(day)
+        self.recurring.set_done(occurrence, True)
+        other, = self.recurring.occurrences(date(2024, 1, 6))
+        self.recurring.set_text(other, 'water cactus')
+        skipped, = self.recurring.occurrences(date(2024, 1, 7))
+        self.recurring.skip(skipped)
+        self.recurring.save()
+
+        recurring = RecurringTasks.load(self.recurring.path)
+        self.assertTrue(recurring.occurrences(day)[0].done)
+        self.assertEqual(recurring.occurrences(date(2024, 1, 6))[0].text, 'water cactus')
+        self.assertEqual(recurring.occurrences(date(2024, 1, 7)), [])
+        self.assertFalse(recurring.occurrences(date(2024, 1, 8))[0].done)
+
+    def test_undone_occurrence_drops_override(self):
+        occurrence, = self.recurring.occurrences(date(2024, 1, 5))
+        self.recurring.set_done(occurrence, True)
+        self.recurring.set_done(occurrence, False)
+        self.assertEqual(self.recurring.overrides, {})
+
+    def test_end_rule(self):
+        self.recurring.end_rule(self.rule.id, date(2024, 1, 10))
+        self.assertEqual(len(self.recurring.occurrences(date(2024, 1, 10))), 1)
+        self.assertEqual(self.recurring.occurrences(date(2024, 1, 11)), [])
+        # rule ended before its start is removed with its overrides
+        occurrence, = self.recurring.occurrences(date(2024, 1, 5))
+        self.recurring.skip(occurrence)
+        self.recurring.end_rule(self.rule.id, date(2023, 12, 31))
+        self.assertEqual((self.recurring.rules, self.recurring.overrides), ({}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from datetime import date
+
+from ToDoList.core import TaskStore
+from ToDoList.server import RemoteStore, TaskServer, socket_file_path
+
+
+DAY = date(2024, 1, 5)
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'task server needs Unix domain sockets')
+class TaskServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        store = TaskStore(self.directory, background=True)
+        store.rebuild_indexes(store.load_indexes())
+        self.server = TaskServer(store, socket_file_path(self.directory))
+        self.server.bind()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.server.close)
+        self.first = self.connect()
+        self.second = self.connect()
+
+    def connect(self):
+        client = RemoteStore.connect(self.directory)
+        self.assertIsNotNone(client)
+        self.addCleanup(client.close)
+        return client
+
+    def sync(self, client):
+        # events are read in order, so they are handled when reply comes
+        client.call('flush')
+
+    def test_changes_are_announced_to_other_clients(self):
+        self.second.tasks(DAY)
+        self.first.add(DAY, 'first')
+        self.sync(self.second)
+        self.assertTrue(self.second.pop_changed(DAY))
+        self.assertFalse(self.second.pop_changed(DAY))
+        self.assertEqual([task.text for task in self.second.tasks(DAY)], ['first'])
+        self.assertFalse(self.first.pop_changed(DAY))
+
+    def test_tasks_are_changed_by_id(self):
+        self.first.add(DAY, 'first')
+        self.first.add(DAY, 'second')
+        self.second.tasks(DAY)
+        self.first.delete_many(DAY, [0])
+        # second client still shows deleted task, edit finds task by id
+        self.second.edit(DAY, 1, 'second edited')
+        self.sync(self.first)
+        self.assertEqual([task.text for task in self.first.tasks(DAY)], ['second edited'])
+
+    def test_month_summary_follows_changes(self):
+        self.assertEqual(self.first.day_summary.get('2024-01-05'), (0, 0))
+        self.first.add(DAY, 'first')
+        self.assertEqual(self.first.day_summary.get('2024-01-05'), (1, 0))
+        self.assertEqual(self.second.day_summary.get('2024-01-05'), (1, 0))
+        self.first.set_done_many(DAY, [0], True)
+        self.sync(self.second)
+        self.assertEqual(self.second.day_summary.get('2024-01-05'), (1, 1))
+        self.assertEqual(self.second.day_summary.get('2024-01-06'), (0, 0))
+
+    def test_undo_reverts_own_changes_only(self):
+        self.first.add(DAY, 'first')
+        self.second.add(DAY, 'second')
+        self.first.delete_many(DAY, [0])
+        self.sync(self.second)
+        self.assertEqual([task.text for task in self.second.tasks(DAY)], ['second'])
+        self.second.set_done_many(DAY, [0], True)
+        self.assertEqual(self.first.undo(), {DAY.strftime(r'%x')})
+        self.sync(self.second)
+        self.assertEqual([(task.text, task.done) for task in self.second.tasks(DAY)], [('first', False), ('second', True)])
+
+    def test_unknown_method_is_error(self):
+        with self.assertRaisesRegex(RuntimeError, 'Unknown method'):
+            self.first.call('format_disk')
+
+
+if __name__ == '__main__':
+    unittest.main()
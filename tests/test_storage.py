@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from ToDoList.storage import MonthJournal, journal_file_path
+
+
+DAY = date(2024, 1, 5).strftime(r'%x')
+
+
+def record(task_id, text, done=False):
+    return task_id, text, done, 1.0, 1.0
+
+
+def texts(data_dict):
+    return [item[1] for item in data_dict.get(DAY, [])]
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+class MonthJournalTest(StorageTestCase):
+    def test_truncated_last_record_is_dropped(self):
+        journal = MonthJournal(self.directory, '2024_01')
+        journal.append(('add', DAY, record(1, 'first')))
+        journal.append(('add', DAY, record(2, 'second')))
+        # crash while last record was written
+        path = journal_file_path(self.directory, '2024_01')
+        os.truncate(path, os.path.getsize(path) - 5)
+
+        journal = MonthJournal(self.directory, '2024_01')
+        self.assertEqual(texts(journal.load()), ['first'])
+        journal.append(('add', DAY, record(3, 'third')))
+        self.assertEqual(texts(MonthJournal(self.directory, '2024_01').load()), ['first', 'third'])
+
+    def test_journal_left_after_compaction_is_not_replayed(self):
+        journal = MonthJournal(self.directory, '2024_01')
+        journal.append(('add', DAY, record(1, 'first')))
+        journal.append(('add', DAY, record(2, 'second')))
+        path = journal_file_path(self.directory, '2024_01')
+        with open(path, 'rb') as f:
+            stale = f.read()
+        journal.compact()
+        # crash after snapshot was written, before journal was removed
+        with open(path, 'wb') as f:
+            f.write(stale)
+
+        journal = MonthJournal(self.directory, '2024_01')
+        self.assertEqual(texts(journal.load()), ['first', 'second'])
+        journal.append(('add', DAY, record(3, 'third')))
+        self.assertEqual(texts(MonthJournal(self.directory, '2024_01').load()), ['first', 'second', 'third'])
+
+
+    def test_record_which_cannot_be_applied_is_dropped(self):
+        journal = MonthJournal(self.directory, '2024_01')
+        journal.append(('add', DAY, record(1, 'first')))
+        # edit of task deleted by another window, written against older month
+        journal.append(('edit', DAY, 1, record(2, 'second')))
+        journal.append(('add', DAY, record(3, 'third')))
+
+        journal = MonthJournal(self.directory, '2024_01')
+        self.assertEqual(texts(journal.load()), ['first'])
+        journal.append(('add', DAY, record(4, 'fourth')))
+        self.assertEqual(texts(MonthJournal(self.directory, '2024_01').load()), ['first', 'fourth'])
+
+
+if __name__ == '__main__':
+    unittest.main()
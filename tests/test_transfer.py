@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from ToDoList.core import TaskStore
+from ToDoList.transfer import import_file
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.data_path = os.path.join(self.directory, 'data')
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        return path
+
+    def import_file(self, path):
+        store = TaskStore(self.data_path)
+        try:
+            return import_file(store, path)
+        finally:
+            store.close()
+
+    def test_row_without_text_is_rejected_before_anything_is_saved(self):
+        path = self.write('tasks.csv', 'date,text\n2024-02-01,first\n2024-03-01\n')
+        with self.assertRaisesRegex(ValueError, 'row 2: text'):
+            self.import_file(path)
+        self.assertEqual(TaskStore(self.data_path).storage.months(), [])
+
+    def test_bad_date_reports_row(self):
+        path = self.write('tasks.jsonl', '{"date": "2024-01-01", "text": "a"}\n{"date": "2024-13-01", "text": "b"}\n')
+        with self.assertRaisesRegex(ValueError, 'row 2'):
+            self.import_file(path)
+
+    def test_rows_with_id_are_imported_once(self):
+        path = self.write('tasks.csv', 'date,text,id\n2024-01-05,first,1\n2024-01-05,second,\n')
+        self.assertEqual(self.import_file(path), (2, 2))
+        self.assertEqual(self.import_file(path), (2, 1))
+        texts = [task.text for task in TaskStore(self.data_path).tasks(date(2024, 1, 5))]
+        self.assertEqual(texts, ['first', 'second', 'second'])
+
+
+if __name__ == '__main__':
+    unittest.main()